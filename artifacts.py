@@ -0,0 +1,148 @@
+import gzip
+import itertools
+import logging
+import os
+import queue
+import random
+import threading
+import time
+
+from common import mask
+from config import (
+    ARTIFACTS_ENABLED,
+    ARTIFACTS_DIR,
+    ARTIFACTS_MAX_FILES,
+    ARTIFACTS_MAX_MB,
+    ARTIFACTS_SAMPLE_RATE,
+    ARTIFACTS_QUEUE_SIZE,
+)
+
+
+class ArtifactStore:
+    """Failure screenshots and page dumps, written by a background thread.
+
+    Capture only grabs bytes from the driver; compression and disk writes happen
+    off the scraping thread. Files are named per PIN and timestamp so concurrent
+    failures never overwrite each other, and the oldest files are evicted once
+    the directory exceeds max_files or max_mb. When the queue is full, or a
+    capture is not sampled, the artifact is dropped rather than blocking.
+    """
+
+    def __init__(
+        self,
+        directory=ARTIFACTS_DIR,
+        enabled=ARTIFACTS_ENABLED,
+        max_files=ARTIFACTS_MAX_FILES,
+        max_mb=ARTIFACTS_MAX_MB,
+        sample_rate=ARTIFACTS_SAMPLE_RATE,
+        queue_size=ARTIFACTS_QUEUE_SIZE,
+    ):
+        self.directory = directory
+        self.enabled = enabled
+        self.max_files = max_files
+        self.max_bytes = max_mb * 1024 * 1024
+        self.sample_rate = sample_rate
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._writer = None
+        self._start_lock = threading.Lock()
+        self._sequence = itertools.count()
+        self._files = []  # (path, size), oldest first
+        self._stats_lock = threading.Lock()
+        self.stats = {"written": 0, "dropped": 0, "evicted": 0}
+
+    def _accept(self):
+        return self.enabled and (self.sample_rate >= 1 or random.random() < self.sample_rate)
+
+    def capture_screenshot(self, driver, pincode, reason):
+        if not self._accept():
+            return
+        try:
+            data = driver.get_screenshot_as_png()
+        except Exception as e:
+            logging.getLogger(__name__).warning("Failed to capture screenshot: %s", str(e))
+            return
+        self._submit(pincode, reason, "png", data, compress=False)
+
+    def capture_page(self, page_source, pincode, reason):
+        if not self._accept():
+            return
+        self._submit(pincode, reason, "html.gz", page_source.encode("utf-8"), compress=True)
+
+    def _submit(self, pincode, reason, extension, data, compress):
+        timestamp = time.strftime("%Y%m%dT%H%M%S")
+        pin = mask(pincode).replace("*", "x") if pincode else "nopin"
+        name = f"{timestamp}_{next(self._sequence):04d}_{pin}_{reason}.{extension}"
+        self._ensure_writer()
+        try:
+            self._queue.put_nowait((name, data, compress))
+        except queue.Full:
+            self._count("dropped")
+
+    def _ensure_writer(self):
+        with self._start_lock:
+            if self._writer and self._writer.is_alive():
+                return
+            os.makedirs(self.directory, exist_ok=True)
+            self._files = sorted(
+                (
+                    (entry.path, entry.stat().st_size, entry.stat().st_mtime)
+                    for entry in os.scandir(self.directory)
+                    if entry.is_file()
+                ),
+                key=lambda f: f[2],
+            )
+            self._files = [(path, size) for path, size, _ in self._files]
+            self._writer = threading.Thread(target=self._run, name="artifact-writer", daemon=True)
+            self._writer.start()
+
+    def _run(self):
+        logger = logging.getLogger(__name__)
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                name, data, compress = item
+                if compress:
+                    data = gzip.compress(data, compresslevel=6)
+                path = os.path.join(self.directory, name)
+                with open(path, "wb") as f:
+                    f.write(data)
+                self._files.append((path, len(data)))
+                self._count("written")
+                self._evict()
+            except OSError as e:
+                logger.warning("Failed to write artifact: %s", str(e))
+            finally:
+                self._queue.task_done()
+
+    def _evict(self):
+        total = sum(size for _, size in self._files)
+        while self._files and (len(self._files) > self.max_files or total > self.max_bytes):
+            path, size = self._files.pop(0)
+            total -= size
+            try:
+                os.remove(path)
+                self._count("evicted")
+            except OSError:
+                continue
+
+    def _count(self, key):
+        # Scraping threads and the writer thread both update the counters
+        with self._stats_lock:
+            self.stats[key] += 1
+
+    def summary(self):
+        with self._stats_lock:
+            return dict(self.stats)
+
+    def close(self, timeout=10):
+        """Flush pending artifacts and stop the writer."""
+        writer = self._writer
+        if not writer or not writer.is_alive():
+            return
+        try:
+            self._queue.put(None, timeout=timeout)
+        except queue.Full:
+            return
+        writer.join(timeout=timeout)
@@ -0,0 +1,100 @@
+"""Measure cold-start import cost of the entry points.
+
+Each module is imported in a fresh interpreter several times; the median wall
+time and the slowest imports reported by ``python -X importtime`` are printed,
+and appended to the GitHub Actions job summary when running in CI.
+
+Usage: python bench_startup.py [module ...] [--runs N]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+DEFAULT_MODULES = ["config", "common", "check_products", "main"]
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Modules are imported from a scratch directory (entry points open product_check.log
+# in the working directory on import), with the repository on the import path
+ENV = {**os.environ, "PYTHONPATH": os.pathsep.join(filter(None, [HERE, os.getenv("PYTHONPATH")]))}
+
+TIMER = (
+    "import time; t = time.perf_counter(); import {module}; "
+    "print(time.perf_counter() - t)"
+)
+
+
+def time_import(module, runs, cwd):
+    """Median seconds to import module in a fresh interpreter, or None if it fails to import."""
+    samples = []
+    for _ in range(runs):
+        result = subprocess.run(
+            [sys.executable, "-c", TIMER.format(module=module)],
+            cwd=cwd,
+            env=ENV,
+            capture_output=True,
+            text=True,
+        )
+        if result.returncode != 0:
+            return None
+        samples.append(float(result.stdout.strip().splitlines()[-1]))
+    return statistics.median(samples)
+
+
+def slowest_imports(module, cwd, top=5):
+    """Top (cumulative_us, name) direct imports of module from -X importtime."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=cwd,
+        env=ENV,
+        capture_output=True,
+        text=True,
+    )
+    # Lines are printed in post-order with two spaces of indent per nesting level,
+    # so the module's direct imports are the depth-1 lines just before its own line.
+    children = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth == 1:
+            children.append((int(cumulative), name.strip()))
+        elif depth == 0:
+            if name.strip() == module:
+                return sorted(children, reverse=True)[:top]
+            children = []
+    return []
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("modules", nargs="*", default=DEFAULT_MODULES)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    rows = []
+    with tempfile.TemporaryDirectory(prefix="bench_startup_") as scratch:
+        for module in args.modules:
+            median = time_import(module, args.runs, scratch)
+            if median is None:
+                rows.append((module, "import failed", ""))
+                continue
+            heaviest = ", ".join(f"{name} {us / 1000:.0f}ms" for us, name in slowest_imports(module, scratch))
+            rows.append((module, f"{median * 1000:.1f} ms", heaviest))
+
+    lines = ["| Module | Median import | Heaviest imports |", "|---|---|---|"]
+    lines += [f"| {module} | {median} | {heaviest} |" for module, median, heaviest in rows]
+    report = "\n".join(lines)
+    print(report)
+
+    summary_path = os.getenv("GITHUB_STEP_SUMMARY")
+    if summary_path:
+        with open(summary_path, "a", encoding="utf-8") as f:
+            f.write("### Startup import time\n\n" + report + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,208 @@
+import json
+import logging
+import os
+import re
+
+from config import CATALOG_FILE
+
+# Stable product IDs. Never renumber or reuse an ID: users.json stores them.
+# Renamed SKUs keep their ID; add the old name to "aliases" instead.
+ANY_ID = 0
+
+DEFAULT_PRODUCTS = [
+    (ANY_ID, "Any", "❗ Any of the products from the list"),
+    (1, "Amul Kool Protein Milkshake | Chocolate, 180 mL | Pack of 30", "🍫🍫Chocolate Milkshake 180mL | Pack of 30"),
+    (2, "Amul Kool Protein Milkshake | Arabica Coffee, 180 mL | Pack of 8", "☕ Coffee Milkshake 180mL | Pack of 8"),
+    (3, "Amul Kool Protein Milkshake | Arabica Coffee, 180 mL | Pack of 30", "☕☕ Coffee Milkshake 180mL | Pack of 30"),
+    (4, "Amul Kool Protein Milkshake | Kesar, 180 mL | Pack of 8", "🌸 Kesar Milkshake 180mL | Pack of 8"),
+    (5, "Amul Kool Protein Milkshake | Kesar, 180 mL | Pack of 30", "🌸🌸 Kesar Milkshake 180mL | Pack of 30"),
+    (6, "Amul Kool Protein Milkshake | Vanilla, 180 mL | Pack of 8", "🍨 Vanilla Milkshake 180mL | Pack of 8"),
+    (7, "Amul Kool Protein Milkshake | Vanilla, 180 mL | Pack of 30", "🍨🍨 Vanilla Milkshake 180mL | Pack of 30"),
+    (8, "Amul High Protein Blueberry Shake, 200 mL | Pack of 30", "🫐🫐 Blueberry Shake 200mL | Pack of 30"),
+    (9, "Amul High Protein Plain Lassi, 200 mL | Pack of 30", "🥛🥛 Plain Lassi 200mL | Pack of 30"),
+    (10, "Amul High Protein Rose Lassi, 200 mL | Pack of 30", "🌹🌹 Rose Lassi 200mL | Pack of 30"),
+    (11, "Amul High Protein Buttermilk, 200 mL | Pack of 30", "🥛🥛 Buttermilk 200mL | Pack of 30"),
+    (12, "Amul High Protein Milk, 250 mL | Pack of 8", "🥛 Milk 250mL | Pack of 8"),
+    (13, "Amul High Protein Milk, 250 mL | Pack of 32", "🥛🥛 Milk 250mL | Pack of 32"),
+    (14, "Amul High Protein Paneer, 400 g | Pack of 24", "🧀🧀 Paneer 400g | Pack of 24"),
+    (15, "Amul High Protein Paneer, 400 g | Pack of 2", "🧀 Paneer 400g | Pack of 2"),
+    (16, "Amul Whey Protein Gift Pack, 32 g | Pack of 10 sachets", "💪 Whey Protein 32g | Pack of 10 sachets"),
+    (17, "Amul Whey Protein, 32 g | Pack of 30 Sachets", "💪💪 Whey Protein 32g | Pack of 30 Sachets"),
+    (18, "Amul Whey Protein Pack, 32 g | Pack of 60 Sachets", "💪💪💪 Whey Protein 32g | Pack of 60 Sachets"),
+    (19, "Amul Chocolate Whey Protein Gift Pack, 34 g | Pack of 10 sachets", "🍫 Chocolate Whey 34g | Pack of 10 sachets"),
+    (20, "Amul Chocolate Whey Protein, 34 g | Pack of 30 sachets", "🍫🍫 Chocolate Whey 34g | Pack of 30 sachets"),
+    (21, "Amul Chocolate Whey Protein, 34 g | Pack of 60 sachets", "🍫🍫🍫 Chocolate Whey 34g | Pack of 60 sachets"),
+]
+
+
+def normalize_name(name):
+    """Reduce a product name to a lookup key that survives case, spacing and punctuation changes."""
+    key = re.sub(r"[^a-z0-9]+", " ", str(name).lower()).strip()
+    return re.sub(r"(\d) (?=[a-z])", r"\1", key)  # "180 ml" -> "180ml"
+
+
+class Product:
+    __slots__ = ("id", "name", "short_name", "aliases")
+
+    def __init__(self, id, name, short_name=None, aliases=()):
+        self.id = id
+        self.name = name
+        self.short_name = short_name or name
+        self.aliases = tuple(aliases)
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "name": self.name,
+            "short_name": self.short_name,
+            "aliases": list(self.aliases),
+        }
+
+    def __repr__(self):
+        return f"Product({self.id}, {self.name!r})"
+
+
+class Catalog:
+    """Products indexed by stable ID and by every normalized name/alias."""
+
+    def __init__(self, products=()):
+        self._by_id = {}
+        self._by_key = {}
+        self.version = 0  # Bumped on every change, for caches built from the catalog
+        for product in products:
+            self.add(product)
+
+    def add(self, product):
+        existing = self._by_id.get(product.id)
+        if existing:
+            # Merge: file entries may rename a built-in SKU or add aliases to it
+            aliases = existing.aliases + (existing.name,) + product.aliases
+            product.aliases = tuple(dict.fromkeys(a for a in aliases if a != product.name))
+        self._by_id[product.id] = product
+        for key in (product.name, product.short_name, *product.aliases):
+            self._by_key[normalize_name(key)] = product
+        self.version += 1
+        return product
+
+    def update_from(self, data):
+        """Merge products from a catalog file's contents ({"products": [...]})."""
+        for entry in data.get("products", []):
+            existing = self._by_id.get(entry["id"])
+            if existing and existing.to_dict() == entry:
+                continue  # Unchanged; keep version so cached keyboards stay valid
+            self.add(Product(
+                entry["id"],
+                entry["name"],
+                entry.get("short_name"),
+                entry.get("aliases", ()),
+            ))
+
+    def to_dict(self):
+        return {"products": [p.to_dict() for p in self]}
+
+    def __iter__(self):
+        return iter(sorted(self._by_id.values(), key=lambda p: p.id))
+
+    def __len__(self):
+        return len(self._by_id)
+
+    def get(self, product_id):
+        return self._by_id.get(product_id)
+
+    def lookup(self, name):
+        """Return the product for a full name, short name or alias, or None."""
+        return self._by_key.get(normalize_name(name))
+
+    def register_scraped(self, names):
+        """Add SKUs seen on the site but missing from the catalog; returns the new products.
+
+        New IDs are assigned in sorted name order so the same set of names always
+        gets the same IDs, whatever order the results arrived in.
+        """
+        logger = logging.getLogger(__name__)
+        new_products = []
+        for name in sorted(set(names), key=normalize_name):
+            if self.lookup(name):
+                continue
+            product = self.add(Product(max(self._by_id, default=ANY_ID) + 1, name))
+            logger.warning("New product found on site, registered as ID %d: %s", product.id, name)
+            new_products.append(product)
+        return new_products
+
+    def resolve_products(self, values):
+        """Convert a stored product list (IDs, or legacy full/short names) into product IDs.
+
+        Legacy names that do not match exactly fall back to the old substring match
+        against catalog names, so existing subscriptions keep working. Names that
+        match nothing are logged and dropped; they never widen to 'Any'. Integer IDs
+        are kept even when unknown: they may belong to SKUs this process has not
+        loaded from the shared catalog yet, and will simply not match a scrape.
+        Only a missing list (None) means 'Any'.
+        """
+        logger = logging.getLogger(__name__)
+        if values is None:
+            return [ANY_ID]
+        ids = []
+        for value in values:
+            if isinstance(value, int):
+                ids.append(value)
+                continue
+            product = self.lookup(value)
+            if product:
+                ids.append(product.id)
+                continue
+            needle = str(value).strip().lower()
+            matches = [
+                p.id for p in self
+                if p.id != ANY_ID and needle and needle in p.name.lower()
+            ]
+            if not matches:
+                logger.warning("Dropping unknown product from subscription: %s", value)
+            ids.extend(matches)
+        return list(dict.fromkeys(ids))
+
+
+def load_catalog(path=CATALOG_FILE):
+    """Load the built-in products merged with a local copy of the catalog file, if any.
+
+    The shared copy in PRIVATE_REPO is merged later by common.refresh_catalog().
+    """
+    logger = logging.getLogger(__name__)
+    catalog = Catalog(Product(*entry) for entry in DEFAULT_PRODUCTS)
+    if path and os.path.exists(path):
+        try:
+            with open(path, encoding="utf-8") as f:
+                catalog.update_from(json.load(f))
+        except (OSError, ValueError, KeyError) as e:
+            logger.error("Could not load catalog from %s: %s", path, str(e))
+    return catalog
+
+
+# Selection masks: bit N corresponds to product ID N
+def ids_to_bits(product_ids):
+    bits = 0
+    for product_id in product_ids:
+        bits |= 1 << product_id
+    return bits
+
+
+def bits_to_ids(bits):
+    ids = []
+    product_id = 0
+    while bits:
+        if bits & 1:
+            ids.append(product_id)
+        bits >>= 1
+        product_id += 1
+    return ids
+
+
+def toggle_bit(bits, product_id):
+    """Toggle a product in a selection mask; 'Any' is mutually exclusive with specific products."""
+    any_bit = 1 << ANY_ID
+    if product_id == ANY_ID:
+        return 0 if bits & any_bit else any_bit
+    return (bits & ~any_bit) ^ (1 << product_id)
+
+
+CATALOG = load_catalog()
@@ -2,25 +2,36 @@ import asyncio
 import os
 import time
 import signal
+import sqlite3
 import sys
-from telegram.ext import Application
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import TimeoutException, StaleElementReferenceException
-from selenium.webdriver.chrome.options import Options
-from bs4 import BeautifulSoup
-from selenium_stealth import stealth
-from common import PRODUCT_NAME_MAP, setup_logging, mask, is_already_running, read_users_file
-from config import TELEGRAM_BOT_TOKEN, SEMAPHORE_LIMIT, MAX_RETRIES
+from artifacts import ArtifactStore
+from catalog import CATALOG, ANY_ID
+from common import setup_logging, mask, is_already_running, read_users_file, refresh_catalog, update_catalog_file
+from config import TELEGRAM_BOT_TOKEN, SEMAPHORE_LIMIT, MAX_RETRIES, PINS_PER_SESSION, FORCE_FULL_CHECK
+from history import AvailabilityHistory
+from planner import RunPlanner
+from sessions import SessionSupervisor
 from threading import Thread
+from types import SimpleNamespace
+# Selenium, selenium_stealth, BeautifulSoup and telegram are imported inside the
+# functions that use them, so a run with nothing to check never loads them.
 
 logger = setup_logging()
 pincode_cache = {}
+session_supervisor = SessionSupervisor()
+artifact_store = ArtifactStore()
+
+BROWSE_URL = "https://shop.amul.com/en/browse/protein"
+# Header elements that reopen the delivery PIN prompt once a PIN is set
+LOCATION_SELECTORS = (
+    ".pincode_wrap",
+    "[data-bs-target='#locationWidgetModal']",
+    "[data-target='#locationWidgetModal']",
+)
 
 def _quit_driver_with_timeout(driver, pincode, timeout=5):
-    """Attempt to quit the driver gracefully with a timeout."""
+    """Attempt to quit the driver gracefully with a timeout, then kill any processes it left behind."""
+    processes = session_supervisor.process_tree(driver)
     try:
         t = Thread(target=driver.quit)
         t.start()
@@ -31,21 +42,29 @@ def _quit_driver_with_timeout(driver, pincode, timeout=5):
         logger.warning(
             "Error quitting driver for pincode %s: %s", mask(pincode), str(e)
         )
+    session_supervisor.reap(driver, processes)
 
 
-def check_product_availability(pincode):
-    global pincode_cache
-    if pincode in pincode_cache:
-        logger.info(f"Using cached results for pincode: {mask(pincode)}")
-        return pincode_cache[pincode]
-    url = "https://shop.amul.com/en/browse/protein"
+def _new_driver():
+    from selenium import webdriver
+    from selenium.webdriver.chrome.options import Options
+    from selenium.webdriver.chrome.service import Service
+    from selenium_stealth import stealth
+
     options = Options()
     options.add_argument("--headless")
     options.add_argument("--user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/137.0.7151.69 Safari/537.36")
-    driver = None
+    service = Service()
+    session_supervisor.wait_for_capacity()
+    logger.info("Initializing Chrome WebDriver...")
     try:
-        logger.info("Initializing Chrome WebDriver...")
-        driver = webdriver.Chrome(options=options)
+        driver = webdriver.Chrome(service=service, options=options)
+    except Exception:
+        # There is no driver to quit, but the chromedriver the service started may still run
+        _quit_driver_with_timeout(SimpleNamespace(service=service, quit=service.stop), None)
+        raise
+    try:
+        session_supervisor.register(driver)
         stealth(driver,
                 languages=["en-US", "en"],
                 vendor="Google Inc.",
@@ -55,163 +74,306 @@ def check_product_availability(pincode):
                 fix_hairline=True)
         logger.info("Chrome WebDriver initialized successfully")
         driver.set_window_size(1920, 1080)
-        logger.info("Navigating to URL: %s", url)
-        driver.get(url)
-        WebDriverWait(driver, 15).until(
-            lambda d: d.execute_script("return document.readyState") == "complete"
+    except Exception:
+        _quit_driver_with_timeout(driver, None)
+        raise
+    return driver
+
+
+def _load_browse_page(driver):
+    from selenium.webdriver.support.ui import WebDriverWait
+
+    logger.info("Navigating to URL: %s", BROWSE_URL)
+    driver.get(BROWSE_URL)
+    WebDriverWait(driver, 15).until(
+        lambda d: d.execute_script("return document.readyState") == "complete"
+    )
+    logger.info("Page loaded completely")
+
+
+def _reset_location(driver):
+    """Forget the delivery PIN held by the session and reload so the PIN prompt shows again."""
+    driver.delete_all_cookies()
+    driver.execute_script("window.localStorage.clear(); window.sessionStorage.clear();")
+    _load_browse_page(driver)
+
+
+def _open_location_selector(driver):
+    """Reopen the delivery PIN prompt in place. Returns False if no selector could open it."""
+    from selenium.common.exceptions import TimeoutException
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support import expected_conditions as EC
+    from selenium.webdriver.support.ui import WebDriverWait
+
+    if any(e.is_displayed() for e in driver.find_elements(By.XPATH, '//*[@id="search"]')):
+        return True
+    for selector in LOCATION_SELECTORS:
+        element = next((e for e in driver.find_elements(By.CSS_SELECTOR, selector) if e.is_displayed()), None)
+        if not element:
+            continue
+        logger.info("Opening location selector via '%s'", selector)
+        driver.execute_script("arguments[0].click();", element)
+        try:
+            WebDriverWait(driver, 5).until(
+                EC.visibility_of_element_located((By.XPATH, '//*[@id="search"]'))
+            )
+            return True
+        except TimeoutException:
+            continue
+    return False
+
+
+def _enter_pincode(driver, pincode):
+    """Type the PIN into the location prompt and pick it from the dropdown. Returns True on success."""
+    from selenium.common.exceptions import TimeoutException, StaleElementReferenceException
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support import expected_conditions as EC
+    from selenium.webdriver.support.ui import WebDriverWait
+
+    try:
+        logger.info("Locating PINCODE input field...")
+        pincode_input = WebDriverWait(driver, 15).until(
+            EC.presence_of_element_located((By.XPATH, '//*[@id="search"]'))
         )
-        logger.info("Page loaded completely")
+        logger.info("PINCODE input field found. Entering PINCODE: %s", mask(pincode))
+        pincode_input.clear()
+        pincode_input.send_keys(pincode)
+        logger.info("PINCODE entered successfully")
+        time.sleep(2)
+        logger.info("Waiting for PINCODE dropdown to appear...")
         try:
-            logger.info("Locating PINCODE input field...")
-            pincode_input = WebDriverWait(driver, 15).until(
-                EC.presence_of_element_located((By.XPATH, '//*[@id="search"]'))
+            WebDriverWait(driver, 15).until(
+                EC.presence_of_element_located((By.ID, "automatic"))
             )
-            logger.info("PINCODE input field found. Entering PINCODE: %s", mask(pincode))
-            pincode_input.clear()
-            pincode_input.send_keys(pincode)
-            logger.info("PINCODE entered successfully")
-            time.sleep(2)
-            logger.info("Waiting for PINCODE dropdown to appear...")
-            try:
-                WebDriverWait(driver, 15).until(
-                    EC.presence_of_element_located((By.ID, "automatic"))
-                )
-                logger.info("Parent container '#automatic' found")
-                max_attempts = 3
-                for attempt in range(max_attempts):
+            logger.info("Parent container '#automatic' found")
+            max_attempts = 3
+            for attempt in range(max_attempts):
+                try:
+                    dropdown_button = WebDriverWait(driver, 15).until(
+                        EC.element_to_be_clickable((By.XPATH, '//*[@id="automatic"]/div[2]/a'))
+                    )
+                    logger.info("Dropdown element found on attempt %d", attempt + 1)
+                    driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", dropdown_button)
+                    time.sleep(1)
+                    logger.info("Scrolled to dropdown element")
+                    logger.info("Dropdown - Is displayed: %s", dropdown_button.is_displayed())
+                    logger.info("Dropdown - Is enabled: %s", dropdown_button.is_enabled())
+                    logger.info("Dropdown - Element text: %s", mask(dropdown_button.text))
+                    logger.info("Attempt %d: Clicking dropdown with JavaScript...", attempt + 1)
+                    driver.execute_script("arguments[0].click();", dropdown_button)
                     try:
-                        dropdown_button = WebDriverWait(driver, 15).until(
-                            EC.element_to_be_clickable((By.XPATH, '//*[@id="automatic"]/div[2]/a'))
+                        WebDriverWait(driver, 10).until(
+                            EC.staleness_of(dropdown_button)
                         )
-                        logger.info("Dropdown element found on attempt %d", attempt + 1)
-                        driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", dropdown_button)
-                        time.sleep(1)
-                        logger.info("Scrolled to dropdown element")
-                        logger.info("Dropdown - Is displayed: %s", dropdown_button.is_displayed())
-                        logger.info("Dropdown - Is enabled: %s", dropdown_button.is_enabled())
-                        logger.info("Dropdown - Element text: %s", mask(dropdown_button.text))
-                        logger.info("Attempt %d: Clicking dropdown with JavaScript...", attempt + 1)
-                        driver.execute_script("arguments[0].click();", dropdown_button)
+                        logger.info("Dropdown clicked successfully and page changed")
+                        break
+                    except TimeoutException:
                         try:
-                            WebDriverWait(driver, 10).until(
-                                EC.staleness_of(dropdown_button)
+                            WebDriverWait(driver, 5).until(
+                                EC.presence_of_element_located((By.CSS_SELECTOR, ".product-grid-item"))
                             )
-                            logger.info("Dropdown clicked successfully and page changed")
+                            logger.info("Products loaded - dropdown click was successful")
                             break
                         except TimeoutException:
-                            try:
-                                WebDriverWait(driver, 5).until(
-                                    EC.presence_of_element_located((By.CSS_SELECTOR, ".product-grid-item"))
-                                )
-                                logger.info("Products loaded - dropdown click was successful")
-                                break
-                            except TimeoutException:
-                                logger.warning("Attempt %d: Click may not have registered, retrying...", attempt + 1)
-                                continue
-                    except StaleElementReferenceException:
-                        logger.warning("Attempt %d: Stale element detected, retrying...", attempt + 1)
-                        continue
-                    except Exception as e:
-                        logger.error("Attempt %d: Unexpected error: %s", attempt + 1, str(e))
-                        continue
-                else:
-                    logger.error("Failed to click the dropdown after %d attempts", max_attempts)
-                    driver.save_screenshot("pincode_final_failure.png")
-                    return []
-            except TimeoutException:
-                logger.error("Pincode %s is not serviceable or dropdown did not appear", mask(pincode))
-                driver.save_screenshot("pincode_dropdown_timeout.png")
-                return []
-            except Exception as e:
-                logger.error("Unexpected error while clicking dropdown: %s", str(e))
-                driver.save_screenshot("pincode_error.png")
-                return []
+                            logger.warning("Attempt %d: Click may not have registered, retrying...", attempt + 1)
+                            continue
+                except StaleElementReferenceException:
+                    logger.warning("Attempt %d: Stale element detected, retrying...", attempt + 1)
+                    continue
+                except Exception as e:
+                    logger.error("Attempt %d: Unexpected error: %s", attempt + 1, str(e))
+                    continue
+            else:
+                logger.error("Failed to click the dropdown after %d attempts", max_attempts)
+                artifact_store.capture_screenshot(driver, pincode, "pincode_final_failure")
+                return False
         except TimeoutException:
-            logger.error("Failed to find PINCODE input field for PINCODE: %s", mask(pincode))
-            driver.save_screenshot("pincode_input_timeout.png")
-            return []
-        logger.info("Waiting for product list to load after PINCODE confirmation...")
-        WebDriverWait(driver, 15).until(
-            EC.presence_of_element_located((By.CSS_SELECTOR, ".product-grid-item"))
-        )
-        logger.info("Product list loaded successfully")
-        logger.info("Parsing page source with BeautifulSoup...")
-        soup = BeautifulSoup(driver.page_source, "html.parser")
-        product_status = []
-        logger.info("Finding all product elements...")
-        products = soup.select(".product-grid-item")
-        logger.info("Found %d product elements with selector '.product-grid-item'", len(products))
-        if not products:
-            logger.warning("No products found with selector '.product-grid-item'. Dumping page source...")
-            with open("page_source.html", "w", encoding="utf-8") as f:
-                f.write(str(soup.prettify()))
-            logger.info("Page source saved to 'page_source.html'")
-        for product in products:
-            name_elem = product.select_one(".product-grid-name")
-            if not name_elem:
-                logger.warning("Product name element not found, skipping...")
+            logger.error("Pincode %s is not serviceable or dropdown did not appear", mask(pincode))
+            artifact_store.capture_screenshot(driver, pincode, "pincode_dropdown_timeout")
+            return False
+        except Exception as e:
+            logger.error("Unexpected error while clicking dropdown: %s", str(e))
+            artifact_store.capture_screenshot(driver, pincode, "pincode_error")
+            return False
+    except TimeoutException:
+        logger.error("Failed to find PINCODE input field for PINCODE: %s", mask(pincode))
+        artifact_store.capture_screenshot(driver, pincode, "pincode_input_timeout")
+        return False
+    return True
+
+
+def _parse_products(page_source, pincode):
+    from bs4 import BeautifulSoup
+
+    logger.info("Parsing page source with BeautifulSoup...")
+    soup = BeautifulSoup(page_source, "html.parser")
+    product_status = []
+    logger.info("Finding all product elements...")
+    products = soup.select(".product-grid-item")
+    logger.info("Found %d product elements with selector '.product-grid-item'", len(products))
+    if not products:
+        logger.warning("No products found with selector '.product-grid-item'. Capturing page source...")
+        artifact_store.capture_page(page_source, pincode, "page_source")
+    for product in products:
+        name_elem = product.select_one(".product-grid-name")
+        if not name_elem:
+            logger.warning("Product name element not found, skipping...")
+            continue
+        name = name_elem.text.strip()
+        logger.info("Processing product: %s", name)
+        sold_out_elem = product.select_one("span.stock-indicator-text")
+        product_classes = product.get("class", [])
+        is_out_of_stock = ("outofstock" in product_classes) or (sold_out_elem and "sold out" in sold_out_elem.text.strip().lower())
+        if is_out_of_stock:
+            logger.info("Product %s has 'Sold Out' indicator or 'outofstock' class", name)
+            product_status.append((name, "Sold Out"))
+        else:
+            logger.info("Product %s is In Stock", name)
+            product_status.append((name, "In Stock"))
+    return product_status
+
+
+def _current_grid(driver):
+    """The first rendered product card, if any, to tell when the grid re-renders."""
+    from selenium.webdriver.common.by import By
+
+    return driver.find_elements(By.CSS_SELECTOR, ".product-grid-item")[:1]
+
+
+def _read_product_grid(driver, pincode, previous_grid):
+    """Wait for the grid to render for the new PIN and parse it.
+
+    Returns None if previous_grid never went stale, i.e. the page did not re-render.
+    """
+    from selenium.common.exceptions import TimeoutException
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support import expected_conditions as EC
+    from selenium.webdriver.support.ui import WebDriverWait
+
+    logger.info("Waiting for product list to load after PINCODE confirmation...")
+    if previous_grid:
+        try:
+            WebDriverWait(driver, 15).until(EC.staleness_of(previous_grid[0]))
+        except TimeoutException:
+            # The old grid is still there, so its contents belong to the previous PIN
+            logger.error("Product list did not re-render for pincode %s", mask(pincode))
+            return None
+    WebDriverWait(driver, 15).until(
+        EC.presence_of_element_located((By.CSS_SELECTOR, ".product-grid-item"))
+    )
+    logger.info("Product list loaded successfully")
+    return _parse_products(driver.page_source, pincode)
+
+
+def check_many(pincodes):
+    """Check several PIN codes in one browser session, yielding (pincode, product_status) as each finishes.
+
+    The browse page is loaded once; later PINs are switched in place through the
+    site's location selector, falling back to clearing the session's location and
+    reloading the page. Once switching in place fails (no selector opens the prompt,
+    or the grid does not re-render), the rest of the session uses the reload path.
+    An empty product_status means the check failed.
+    """
+    driver = None
+    current_pincode = None
+    switch_in_place = True
+    try:
+        for pincode in pincodes:
+            if pincode in pincode_cache:
+                logger.info(f"Using cached results for pincode: {mask(pincode)}")
+                yield pincode, pincode_cache[pincode]
                 continue
-            name = name_elem.text.strip()
-            logger.info("Processing product: %s", name)
-            sold_out_elem = product.select_one("span.stock-indicator-text")
-            product_classes = product.get("class", [])
-            is_out_of_stock = ("outofstock" in product_classes) or (sold_out_elem and "sold out" in sold_out_elem.text.strip().lower())
-            if is_out_of_stock:
-                logger.info("Product %s has 'Sold Out' indicator or 'outofstock' class", name)
-                product_status.append((name, "Sold Out"))
-            else:
-                logger.info("Product %s is In Stock", name)
-                product_status.append((name, "In Stock"))
-        logger.info("Final product status: %s", product_status)
-        pincode_cache[pincode] = product_status
-        logger.info(f"Cached results for pincode: {mask(pincode)}")
-        return product_status
-    except Exception as e:
-        logger.error("Error checking pincode %s: %s", mask(pincode), str(e))
-        if driver:
+            current_pincode = pincode
+            product_status = []
             try:
-                driver.save_screenshot("chrome_error.png")
-            except Exception:
-                logger.warning("Failed to save screenshot")
-        return []
+                if driver is None:
+                    driver = _new_driver()
+                    _load_browse_page(driver)
+                    previous_grid = []
+                elif switch_in_place:
+                    previous_grid = _current_grid(driver)
+                    if not _open_location_selector(driver):
+                        logger.info("Location selector unavailable, reloading for the rest of this session")
+                        switch_in_place = False
+                        _reset_location(driver)
+                        previous_grid = []
+                else:
+                    _reset_location(driver)
+                    previous_grid = []
+                if _enter_pincode(driver, pincode):
+                    product_status = _read_product_grid(driver, pincode, previous_grid)
+                    if product_status is None:
+                        logger.info("Switching PIN in place did not re-render, reloading for the rest of this session")
+                        switch_in_place = False
+                        _reset_location(driver)
+                        product_status = []
+                        if _enter_pincode(driver, pincode):
+                            product_status = _read_product_grid(driver, pincode, []) or []
+            except Exception as e:
+                logger.error("Error checking pincode %s: %s", mask(pincode), str(e))
+                if driver:
+                    artifact_store.capture_screenshot(driver, pincode, "chrome_error")
+                    # The session is in an unknown state; start the next PIN in a fresh one
+                    _quit_driver_with_timeout(driver, pincode)
+                    driver = None
+            if product_status:
+                logger.info("Final product status: %s", product_status)
+                pincode_cache[pincode] = product_status
+                logger.info(f"Cached results for pincode: {mask(pincode)}")
+            yield pincode, product_status
+            if driver and session_supervisor.over_budget(driver):
+                _quit_driver_with_timeout(driver, pincode)
+                driver = None
     finally:
         if driver:
-            logger.info("Closing WebDriver for pincode %s", mask(pincode))
-            _quit_driver_with_timeout(driver, pincode)
+            logger.info("Closing WebDriver after pincode %s", mask(current_pincode))
+            _quit_driver_with_timeout(driver, current_pincode)
+
+
+def check_product_availability(pincode):
+    for _, product_status in check_many([pincode]):
+        return product_status
+    return []
+
 
-async def send_telegram_notification_for_user(app, chat_id, pincode, product_names, products):
+def _split_batches(pincodes):
+    """Spread PINs round-robin over enough sessions to use the concurrency limit,
+    keeping each session at or under PINS_PER_SESSION."""
+    if not pincodes:
+        return []
+    count = max(min(SEMAPHORE_LIMIT, len(pincodes)), -(-len(pincodes) // PINS_PER_SESSION))
+    return [pincodes[i::count] for i in range(count)]
+
+async def send_telegram_notification_for_user(app, chat_id, pincode, product_ids, products):
     try:
         async with asyncio.timeout(10):
             if not products:
                 logger.info("No products found to notify for chat_id %s", mask(chat_id))
                 return
-            check_all_products = len(product_names) == 1 and product_names[0].strip().lower() == "any"
+            in_stock_products = []
+            for name, status in products:
+                if status == "In Stock":
+                    product = CATALOG.lookup(name)
+                    in_stock_products.append((product.id if product else None, name))
+            wanted = set(product_ids)
+            check_all_products = ANY_ID in wanted
             if check_all_products:
-                in_stock_products = [(name, status) for name, status in products if status == "In Stock"]
                 logger.info("In Stock products for 'Any' for chat_id %s: %s", mask(chat_id), in_stock_products)
-                if not in_stock_products:
-                    message = f"None of the Amul Protein items are available for your PINCODE: {pincode}"
-                    logger.info("All products Sold Out for chat_id %s, PINCODE %s", mask(chat_id), mask(pincode))
-                else:
-                    message = f"Available Amul Protein Products for PINCODE {pincode}:\n\n"
-                    for name, _ in in_stock_products:
-                        short_name = PRODUCT_NAME_MAP.get(name, name)
-                        message += f"- {short_name}\n"
-                    logger.info("Sending notification for chat_id %s: %s", mask(chat_id), message)
-                    await app.bot.send_message(chat_id=chat_id, text=message, parse_mode="Markdown")
+                relevant_products = in_stock_products
             else:
-                in_stock_products = [(name, status) for name, status in products if status == "In Stock"]
                 logger.info("In Stock products for specific list for chat_id %s: %s", mask(chat_id), in_stock_products)
-                relevant_products = [(name, status) for name, status in in_stock_products if any(p.lower() in name.lower() for p in product_names)]
-                if relevant_products:
-                    message = f"Available Amul Protein Products for PINCODE {pincode}:\n\n"
-                    for name, _ in relevant_products:
-                        short_name = PRODUCT_NAME_MAP.get(name, name)
-                        message += f"- {short_name}\n"
-                    logger.info("Sending notification for chat_id %s: %s", mask(chat_id), message)
-                    await app.bot.send_message(chat_id=chat_id, text=message, parse_mode="Markdown")
-                else:
-                    logger.info("No 'In Stock' product to notify for chat_id %s", mask(chat_id))
+                relevant_products = [(pid, name) for pid, name in in_stock_products if pid in wanted]
+            if relevant_products:
+                message = f"Available Amul Protein Products for PINCODE {pincode}:\n\n"
+                for pid, name in relevant_products:
+                    short_name = CATALOG.get(pid).short_name if pid is not None else name
+                    message += f"- {short_name}\n"
+                logger.info("Sending notification for chat_id %s: %s", mask(chat_id), message)
+                await app.bot.send_message(chat_id=chat_id, text=message, parse_mode="Markdown")
+            elif check_all_products:
+                logger.info("All products Sold Out for chat_id %s, PINCODE %s", mask(chat_id), mask(pincode))
+            else:
+                logger.info("No 'In Stock' product to notify for chat_id %s", mask(chat_id))
     except asyncio.TimeoutError:
         logger.error("Timeout sending notification to chat_id %s for pincode %s", mask(chat_id), mask(pincode))
     except Exception as e:
@@ -221,6 +383,7 @@ async def check_products_for_users():
     logger.info("Starting product check for all users")
     global pincode_cache
     pincode_cache.clear()
+    session_supervisor.reset_stats()
     logger.info("Pincode cache cleared")
 
     users_data = read_users_file()
@@ -229,22 +392,44 @@ async def check_products_for_users():
         logger.info("No active users to check")
         return
 
+    all_pincode_groups = {}
+    for user in active_users:
+        pincode = user.get("pincode")
+        if not pincode:
+            logger.error("Skipping user with missing pincode: %s", user)
+            continue
+        if pincode not in all_pincode_groups:
+            all_pincode_groups[pincode] = []
+        all_pincode_groups[pincode].append(user)
+
+    history = AvailabilityHistory()
+    planner = RunPlanner(history=history)
+    due, skipped_pincodes = planner.plan(all_pincode_groups, force_full=FORCE_FULL_CHECK)
+    due_reasons = {}
+    for pincode, reason in due:
+        due_reasons.setdefault(reason, []).append(pincode)
+    logger.info(
+        "Run plan: %d due (%s), %d skipped as fresh",
+        len(due),
+        ", ".join(f"{reason}: {len(p)}" for reason, p in due_reasons.items()) or "none",
+        len(skipped_pincodes),
+    )
+    if not due:
+        logger.info("No pincodes due for a check")
+        planner.save()
+        history.close()
+        return
+    pincode_groups = {pincode: all_pincode_groups[pincode] for pincode, _ in due}
+
+    from telegram.ext import Application
+
     app = Application.builder().token(TELEGRAM_BOT_TOKEN).build()
     await app.initialize()
 
     successful_pincodes = set()
+    scraped_names = set()
 
     try:
-        pincode_groups = {}
-        for user in active_users:
-            pincode = user.get("pincode")
-            if not pincode:
-                logger.error("Skipping user with missing pincode: %s", user)
-                continue
-            if pincode not in pincode_groups:
-                pincode_groups[pincode] = []
-            pincode_groups[pincode].append(user)
-
         initial_pincodes = set(pincode_groups.keys())
         semaphore = asyncio.Semaphore(SEMAPHORE_LIMIT)
         max_retries = MAX_RETRIES
@@ -254,36 +439,72 @@ async def check_products_for_users():
                 break
             logger.info("Attempt %d/%d: Checking %d pincodes", attempt + 1, max_retries + 1, len(pincode_groups))
 
-            async def process_single_pincode(pincode, users):
-                async with semaphore:
-                    try:
-                        loop = asyncio.get_event_loop()
-                        product_status = await loop.run_in_executor(None, check_product_availability, pincode)
-                        if product_status:  # Success if product_status is not empty
-                            notification_tasks = []
-                            for user in users:
-                                chat_id = user.get("chat_id")
-                                products_to_check = user.get("products")
-                                task = asyncio.create_task(
-                                    send_telegram_notification_for_user(
-                                        app, chat_id, pincode, products_to_check, product_status
-                                    )
+            async def process_result(pincode, users, product_status):
+                try:
+                    if product_status:  # Success if product_status is not empty
+                        scraped_names.update(name for name, _ in product_status)
+                        planner.record(pincode, users, product_status)
+                        notification_tasks = []
+                        for user in users:
+                            chat_id = user.get("chat_id")
+                            products_to_check = user["products"]
+                            task = asyncio.create_task(
+                                send_telegram_notification_for_user(
+                                    app, chat_id, pincode, products_to_check, product_status
                                 )
-                                notification_tasks.append(task)
-                            if notification_tasks:
-                                await asyncio.gather(*notification_tasks)
-                            return True
-                        else:
-                            logger.warning("Pincode %s check failed: empty product status", mask(pincode))
-                            return False
-                    except Exception as e:
-                        logger.error("Error processing pincode %s: %s", mask(pincode), str(e))
+                            )
+                            notification_tasks.append(task)
+                        if notification_tasks:
+                            await asyncio.gather(*notification_tasks)
+                        # History only tunes later runs; a broken history.db must not fail the PIN
+                        try:
+                            history.record(pincode, product_status)
+                        except sqlite3.Error as e:
+                            logger.error("Could not record availability history for pincode %s: %s", mask(pincode), str(e))
+                        return True
+                    else:
+                        logger.warning("Pincode %s check failed: empty product status", mask(pincode))
                         return False
+                except Exception as e:
+                    logger.error("Error processing pincode %s: %s", mask(pincode), str(e))
+                    return False
+
+            loop = asyncio.get_running_loop()
+            results_queue = asyncio.Queue()
+
+            def run_batch(batch):
+                # Runs in a worker thread; streams each PIN's result back to the event loop
+                try:
+                    for item in check_many(batch):
+                        loop.call_soon_threadsafe(results_queue.put_nowait, item)
+                except Exception as e:
+                    logger.error("Error in browser session for %d pincodes: %s", len(batch), str(e))
+                finally:
+                    loop.call_soon_threadsafe(results_queue.put_nowait, None)
+
+            async def process_batch(batch):
+                async with semaphore:
+                    await loop.run_in_executor(None, run_batch, batch)
 
             pincodes = list(pincode_groups.keys())
-            tasks = [asyncio.create_task(process_single_pincode(pincode, pincode_groups[pincode]))
-                     for pincode in pincodes]
-            results = await asyncio.gather(*tasks)
+            batches = _split_batches(pincodes)
+            logger.info("Checking %d pincodes in %d browser sessions", len(pincodes), len(batches))
+            batch_tasks = [asyncio.create_task(process_batch(batch)) for batch in batches]
+            result_tasks = {}
+            pending_batches = len(batches)
+            while pending_batches:
+                item = await results_queue.get()
+                if item is None:
+                    pending_batches -= 1
+                    continue
+                pincode, product_status = item
+                result_tasks[pincode] = asyncio.create_task(
+                    process_result(pincode, pincode_groups[pincode], product_status)
+                )
+            await asyncio.gather(*batch_tasks)
+            done = dict(zip(result_tasks, await asyncio.gather(*result_tasks.values())))
+            # PINs a crashed session never reached count as failed
+            results = [done.get(pincode, False) for pincode in pincodes]
 
             for pincode, success in zip(pincodes, results):
                 if success:
@@ -303,14 +524,39 @@ async def check_products_for_users():
 
         unsuccessful_pincodes = initial_pincodes - successful_pincodes
         logger.info("--- Final Pincode Check Summary ---")
+        logger.info("Total active pincodes: %d", len(all_pincode_groups))
         logger.info("Total pincodes checked: %d", len(initial_pincodes))
         logger.info("Successfully checked pincodes: %d -> %s", len(successful_pincodes), [mask(p) for p in sorted(list(successful_pincodes))])
         logger.info("Unsuccessfully checked pincodes (after all retries): %d -> %s", len(unsuccessful_pincodes), [mask(p) for p in sorted(list(unsuccessful_pincodes))])
+        logger.info("Skipped pincodes (not due): %d -> %s", len(skipped_pincodes), [mask(p) for p in sorted(skipped_pincodes)])
+        logger.info("Browser sessions: %s", session_supervisor.summary())
+        artifact_store.close()  # Flush queued captures so the counts are final
+        logger.info("Failure artifacts: %s", artifact_store.summary())
 
     except Exception as e:
         logger.error("Error in main processing: %s", str(e))
         raise
     finally:
+        artifact_store.close()
+        planner.save()
+        try:
+            history.compact()
+        except sqlite3.Error as e:
+            logger.error("Could not compact availability history: %s", str(e))
+        history.close()
+        # Register unseen SKUs once per run, so their IDs do not depend on result order.
+        # Without the shared catalog, IDs other runs assigned are unknown here and could be reused.
+        if not refresh_catalog():
+            logger.warning("Shared catalog unavailable, not registering new products this run")
+            new_products = []
+        else:
+            new_products = CATALOG.register_scraped(scraped_names)
+        if new_products:
+            try:
+                if update_catalog_file():
+                    logger.info("Saved %d new products to catalog", len(new_products))
+            except Exception as e:
+                logger.error("Could not save catalog: %s", str(e))
         await app.shutdown()
         logger.info("Application shutdown completed")
 
@@ -2,70 +2,19 @@ import base64
 import json
 import logging
 import os
-import psutil
-import requests
+import time
 
+from catalog import CATALOG
 from config import (
     LOG_FILE,
     USERS_FILE,
+    CATALOG_FILE,
+    CATALOG_REFRESH_SECONDS,
     PRIVATE_REPO,
     GITHUB_BRANCH,
     GH_PAT,
 )
 
-# Constants
-PRODUCTS = [
-    "Any",
-    "Amul Kool Protein Milkshake | Chocolate, 180 mL | Pack of 30",
-    "Amul Kool Protein Milkshake | Arabica Coffee, 180 mL | Pack of 8",
-    "Amul Kool Protein Milkshake | Arabica Coffee, 180 mL | Pack of 30",
-    "Amul Kool Protein Milkshake | Kesar, 180 mL | Pack of 8",
-    "Amul Kool Protein Milkshake | Kesar, 180 mL | Pack of 30",
-    "Amul Kool Protein Milkshake | Vanilla, 180 mL | Pack of 8",
-    "Amul Kool Protein Milkshake | Vanilla, 180 mL | Pack of 30",
-    "Amul High Protein Blueberry Shake, 200 mL | Pack of 30",
-    "Amul High Protein Plain Lassi, 200 mL | Pack of 30",
-    "Amul High Protein Rose Lassi, 200 mL | Pack of 30",
-    "Amul High Protein Buttermilk, 200 mL | Pack of 30",
-    "Amul High Protein Milk, 250 mL | Pack of 8",
-    "Amul High Protein Milk, 250 mL | Pack of 32",
-    "Amul High Protein Paneer, 400 g | Pack of 24",
-    "Amul High Protein Paneer, 400 g | Pack of 2",
-    "Amul Whey Protein Gift Pack, 32 g | Pack of 10 sachets",
-    "Amul Whey Protein, 32 g | Pack of 30 Sachets",
-    "Amul Whey Protein Pack, 32 g | Pack of 60 Sachets",
-    "Amul Chocolate Whey Protein Gift Pack, 34 g | Pack of 10 sachets",
-    "Amul Chocolate Whey Protein, 34 g | Pack of 30 sachets",
-    "Amul Chocolate Whey Protein, 34 g | Pack of 60 sachets",
-]
-
-PRODUCT_NAME_MAP = {
-    "Any": "❗ Any of the products from the list",
-    "Amul Kool Protein Milkshake | Chocolate, 180 mL | Pack of 30": "🍫🍫Chocolate Milkshake 180mL | Pack of 30",
-    "Amul Kool Protein Milkshake | Arabica Coffee, 180 mL | Pack of 8": "☕ Coffee Milkshake 180mL | Pack of 8",
-    "Amul Kool Protein Milkshake | Arabica Coffee, 180 mL | Pack of 30": "☕☕ Coffee Milkshake 180mL | Pack of 30",
-    "Amul Kool Protein Milkshake | Kesar, 180 mL | Pack of 8": "🌸 Kesar Milkshake 180mL | Pack of 8",
-    "Amul Kool Protein Milkshake | Kesar, 180 mL | Pack of 30": "🌸🌸 Kesar Milkshake 180mL | Pack of 30",
-    "Amul Kool Protein Milkshake | Vanilla, 180 mL | Pack of 8": "🍨 Vanilla Milkshake 180mL | Pack of 8",
-    "Amul Kool Protein Milkshake | Vanilla, 180 mL | Pack of 30": "🍨🍨 Vanilla Milkshake 180mL | Pack of 30",
-    "Amul High Protein Blueberry Shake, 200 mL | Pack of 30": "🫐🫐 Blueberry Shake 200mL | Pack of 30",
-    "Amul High Protein Plain Lassi, 200 mL | Pack of 30": "🥛🥛 Plain Lassi 200mL | Pack of 30",
-    "Amul High Protein Rose Lassi, 200 mL | Pack of 30": "🌹🌹 Rose Lassi 200mL | Pack of 30",
-    "Amul High Protein Buttermilk, 200 mL | Pack of 30": "🥛🥛 Buttermilk 200mL | Pack of 30",
-    "Amul High Protein Milk, 250 mL | Pack of 8": "🥛 Milk 250mL | Pack of 8",
-    "Amul High Protein Milk, 250 mL | Pack of 32": "🥛🥛 Milk 250mL | Pack of 32",
-    "Amul High Protein Paneer, 400 g | Pack of 24": "🧀🧀 Paneer 400g | Pack of 24",
-    "Amul High Protein Paneer, 400 g | Pack of 2": "🧀 Paneer 400g | Pack of 2",
-    "Amul Whey Protein Gift Pack, 32 g | Pack of 10 sachets": "💪 Whey Protein 32g | Pack of 10 sachets",
-    "Amul Whey Protein, 32 g | Pack of 30 Sachets": "💪💪 Whey Protein 32g | Pack of 30 Sachets",
-    "Amul Whey Protein Pack, 32 g | Pack of 60 Sachets": "💪💪💪 Whey Protein 32g | Pack of 60 Sachets",
-    "Amul Chocolate Whey Protein Gift Pack, 34 g | Pack of 10 sachets": "🍫 Chocolate Whey 34g | Pack of 10 sachets",
-    "Amul Chocolate Whey Protein, 34 g | Pack of 30 sachets": "🍫🍫 Chocolate Whey 34g | Pack of 30 sachets",
-    "Amul Chocolate Whey Protein, 34 g | Pack of 60 sachets": "🍫🍫🍫 Chocolate Whey 34g | Pack of 60 sachets",
-}
-
-SHORT_TO_FULL = {v: k for k, v in PRODUCT_NAME_MAP.items()}
-
 # Logging setup
 def setup_logging():
     logging.basicConfig(
@@ -88,6 +37,8 @@ def mask(value, visible=2):
 def is_already_running(script_name):
     logger = logging.getLogger(__name__)
     logger.info("Checking for running instances of %s", script_name)
+    import psutil
+
     current_pid = os.getpid()
     try:
         for proc in psutil.process_iter(["pid", "name", "cmdline"]):
@@ -110,6 +61,8 @@ def is_already_running(script_name):
     return False
 
 def get_file_sha(path):
+    import requests
+
     logger = logging.getLogger(__name__)
     url = f"https://api.github.com/repos/{PRIVATE_REPO}/contents/{path}?ref={GITHUB_BRANCH}"
     headers = {
@@ -128,6 +81,8 @@ def get_file_sha(path):
     return None
 
 def read_users_file():
+    import requests
+
     logger = logging.getLogger(__name__)
     url = f"https://api.github.com/repos/{PRIVATE_REPO}/contents/{USERS_FILE}?ref={GITHUB_BRANCH}"
     headers = {
@@ -143,4 +98,92 @@ def read_users_file():
         )
         return {"users": []}
     content = base64.b64decode(response.json()["content"]).decode()
+    users_data = json.loads(content)
+    # Older entries store product names; normalize everything to catalog IDs
+    refresh_catalog()
+    for user in users_data.get("users", []):
+        user["products"] = CATALOG.resolve_products(user.get("products"))
+    return users_data
+
+_catalog_refreshed_at = None
+
+def read_catalog_file():
+    """Read the shared catalog file (SKUs added beyond the built-in ones).
+
+    Returns None if the file does not exist yet and False if it could not be read.
+    """
+    import requests
+
+    logger = logging.getLogger(__name__)
+    url = f"https://api.github.com/repos/{PRIVATE_REPO}/contents/{CATALOG_FILE}?ref={GITHUB_BRANCH}"
+    headers = {
+        "Authorization": f"token {GH_PAT}",
+        "Accept": "application/vnd.github+json",
+    }
+    response = requests.get(url, headers=headers)
+    if response.status_code == 404:
+        return None
+    if response.status_code != 200:
+        logger.error(
+            "Failed to read %s: Status %d, Response: %s",
+            CATALOG_FILE,
+            response.status_code,
+            response.text,
+        )
+        return False
+    content = base64.b64decode(response.json()["content"]).decode()
     return json.loads(content)
+
+def refresh_catalog(max_age=CATALOG_REFRESH_SECONDS):
+    """Merge the shared catalog file into CATALOG, at most once per max_age seconds.
+
+    Returns False if the shared catalog could not be read; the next call retries.
+    """
+    global _catalog_refreshed_at
+    logger = logging.getLogger(__name__)
+    if _catalog_refreshed_at is not None and time.monotonic() - _catalog_refreshed_at < max_age:
+        return True
+    try:
+        catalog_data = read_catalog_file()
+    except Exception as e:
+        logger.error("Error reading %s: %s", CATALOG_FILE, str(e))
+        return False
+    if catalog_data is False:
+        return False
+    _catalog_refreshed_at = time.monotonic()
+    if catalog_data:
+        CATALOG.update_from(catalog_data)
+    return True
+
+def update_catalog_file():
+    """Write CATALOG to the shared catalog file so the bot and later runs see the same IDs."""
+    import requests
+
+    logger = logging.getLogger(__name__)
+    url = f"https://api.github.com/repos/{PRIVATE_REPO}/contents/{CATALOG_FILE}"
+    headers = {
+        "Authorization": f"token {GH_PAT}",
+        "Accept": "application/vnd.github+json",
+    }
+    data = {
+        "message": "Update catalog.json with new products",
+        "content": base64.b64encode(
+            json.dumps(CATALOG.to_dict(), indent=2, ensure_ascii=False).encode()
+        ).decode(),
+        "branch": GITHUB_BRANCH,
+    }
+    # The file may not exist yet; GitHub creates it when no sha is given
+    lookup = requests.get(f"{url}?ref={GITHUB_BRANCH}", headers=headers)
+    if lookup.status_code == 200:
+        data["sha"] = lookup.json()["sha"]
+    response = requests.put(url, headers=headers, json=data)
+    if response.status_code in (200, 201):
+        logger.info("Successfully updated %s", CATALOG_FILE)
+        return True
+    logger.error(
+        "Failed to update %s: Status %d, Response: %s",
+        CATALOG_FILE,
+        response.status_code,
+        response.text,
+    )
+    return False
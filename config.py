@@ -1,8 +1,25 @@
 import os
-from dotenv import load_dotenv
 
-# Load environment variables from .env file
-load_dotenv()
+def _find_env_file():
+    """The nearest .env in this file's directory or its parents, as python-dotenv's find_dotenv() searches."""
+    directory = os.path.dirname(os.path.abspath(__file__))
+    while True:
+        path = os.path.join(directory, ".env")
+        if os.path.isfile(path):
+            return path
+        parent = os.path.dirname(directory)
+        if parent == directory:
+            return None
+        directory = parent
+
+
+# Load environment variables from .env file; skip importing python-dotenv when there is none
+# (e.g. CI, where secrets come from the environment)
+_ENV_FILE = _find_env_file()
+if _ENV_FILE:
+    from dotenv import load_dotenv
+
+    load_dotenv(_ENV_FILE)
 
 # --- Secrets and Environment-Specific ---
 TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
@@ -13,7 +30,42 @@ GITHUB_BRANCH = "main"
 # --- Concurrency and Retries for Scraper ---
 SEMAPHORE_LIMIT = 5  # Max concurrent Selenium instances
 MAX_RETRIES = 2      # Retries for failed PIN code checks
+PINS_PER_SESSION = 25  # Max PIN codes checked in one browser session
+
+# --- Browser Memory Limits ---
+SESSION_RSS_BUDGET_MB = 600    # Recycle a Chrome session whose process tree grows past this
+GLOBAL_RSS_CEILING_MB = 2500   # Hold back new sessions while all sessions together exceed this
+SESSION_THROTTLE_TIMEOUT = 60  # Seconds a new session waits for memory before starting anyway
+
+# --- Failure Artifacts (screenshots, page dumps) ---
+ARTIFACTS_ENABLED = os.getenv("ARTIFACTS_ENABLED", "1").lower() not in ("0", "false", "no")
+ARTIFACTS_DIR = "artifacts"
+ARTIFACTS_MAX_FILES = 50
+ARTIFACTS_MAX_MB = 25
+ARTIFACTS_SAMPLE_RATE = 1.0  # Fraction of failures that get captured
+ARTIFACTS_QUEUE_SIZE = 20    # Pending captures beyond this are dropped
 
 # --- File Paths ---
 LOG_FILE = "product_check.log"
 USERS_FILE = "users.json"
+CATALOG_FILE = "catalog.json"  # SKUs added beyond the built-in catalog, kept in PRIVATE_REPO next to USERS_FILE
+CATALOG_REFRESH_SECONDS = 300  # How often the bot re-reads the shared catalog
+
+# --- Incremental Run Planning ---
+PLANNER_STATE_FILE = "planner_state.json"
+FORCE_FULL_CHECK = os.getenv("FORCE_FULL_CHECK", "").lower() in ("1", "true", "yes")
+# Seconds between scheduled check_products.py runs (the README's 15-minute schedule).
+# The planner can only skip PINs when runs come more often than CHECK_INTERVAL_MAX.
+CHECK_RUN_CADENCE = int(os.getenv("CHECK_RUN_CADENCE", 15 * 60))
+CHECK_INTERVAL_MIN = CHECK_RUN_CADENCE      # A PIN whose stock keeps changing is checked every run
+CHECK_INTERVAL_MAX = 8 * CHECK_RUN_CADENCE  # A PIN whose stock never changes is checked every 8th run
+CHECK_INTERVAL_SLACK = 60         # Tolerance for scheduler jitter
+VOLATILITY_ALPHA = 0.3            # Weight of the latest check in the volatility average
+
+# --- Availability History ---
+HISTORY_FILE = "history.db"
+HISTORY_RAW_DAYS = 7          # Keep every observation this long, then one row per hour
+HISTORY_RETENTION_DAYS = 90
+HISTORY_MIN_EVENTS = 3        # Restocks a PIN needs before its own pattern is used over its region's
+RESTOCK_INTERVAL_FAST = 0.5   # Interval multiplier when a restock is certain in the next hours
+RESTOCK_INTERVAL_SLOW = 1.5   # Interval multiplier when history shows no restocks then
@@ -0,0 +1,179 @@
+import logging
+import sqlite3
+import time
+
+from catalog import CATALOG
+from config import (
+    HISTORY_FILE,
+    HISTORY_RAW_DAYS,
+    HISTORY_RETENTION_DAYS,
+    HISTORY_MIN_EVENTS,
+)
+
+HOUR = 3600
+DAY = 24 * HOUR
+IST_OFFSET = 19800  # Restock patterns follow Indian local time
+EPOCH_WEEKDAY_HOURS = 3 * 24  # 1970-01-01 was a Thursday; shift so Monday 00:00 is hour 0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS observations (
+    ts INTEGER NOT NULL,
+    pincode TEXT NOT NULL,
+    region TEXT NOT NULL,
+    product_id INTEGER NOT NULL,
+    in_stock INTEGER NOT NULL,
+    hourly INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_observations_pincode ON observations (pincode, product_id, ts);
+CREATE INDEX IF NOT EXISTS idx_observations_region ON observations (region, product_id, ts);
+CREATE INDEX IF NOT EXISTS idx_observations_ts ON observations (ts, hourly);
+"""
+
+# Week index of a timestamp column, matching week_of()
+WEEK_SQL = f"((({{ts}} + {IST_OFFSET}) / {HOUR} + {EPOCH_WEEKDAY_HOURS}) / 168)"
+
+
+def region_of(pincode):
+    """The first three digits of a PIN identify its sorting district."""
+    return str(pincode)[:3]
+
+
+def hour_of_week(ts):
+    """0 = Monday 00:00 IST."""
+    return (int(ts + IST_OFFSET) // HOUR + EPOCH_WEEKDAY_HOURS) % 168
+
+
+def week_of(ts):
+    return (int(ts + IST_OFFSET) // HOUR + EPOCH_WEEKDAY_HOURS) // 168
+
+
+class AvailabilityHistory:
+    """Append-only SQLite store of (timestamp, PIN, product ID, in stock) observations.
+
+    Raw observations are kept for HISTORY_RAW_DAYS, then merged into one row per
+    hour (in stock if any check in that hour saw it in stock) and dropped after
+    HISTORY_RETENTION_DAYS. Restocks are Sold Out -> In Stock transitions between
+    consecutive observations of a product at a PIN.
+    """
+
+    def __init__(self, path=HISTORY_FILE):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def record(self, pincode, product_status, ts=None):
+        ts = int(ts if ts is not None else time.time())
+        rows = []
+        for name, status in product_status:
+            product = CATALOG.lookup(name)
+            if product:
+                rows.append((ts, pincode, region_of(pincode), product.id, int(status == "In Stock")))
+        with self.conn:
+            self.conn.executemany(
+                "INSERT INTO observations (ts, pincode, region, product_id, in_stock) VALUES (?, ?, ?, ?, ?)",
+                rows,
+            )
+        return len(rows)
+
+    def compact(self, now=None):
+        """Downsample raw rows older than HISTORY_RAW_DAYS to hourly rows and apply retention."""
+        logger = logging.getLogger(__name__)
+        now = int(now if now is not None else time.time())
+        # Buckets and cutoff follow IST hours, the same hours hour_of_week() uses,
+        # so no hour is split between raw and hourly rows or shifted by compaction
+        cutoff = (now - HISTORY_RAW_DAYS * DAY + IST_OFFSET) // HOUR * HOUR - IST_OFFSET
+        with self.conn:
+            self.conn.execute(
+                f"""
+                INSERT INTO observations (ts, pincode, region, product_id, in_stock, hourly)
+                SELECT ((ts + {IST_OFFSET}) / {HOUR}) * {HOUR} - {IST_OFFSET},
+                       pincode, region, product_id, MAX(in_stock), 1
+                FROM observations
+                WHERE ts < ? AND hourly = 0
+                GROUP BY (ts + {IST_OFFSET}) / {HOUR}, pincode, region, product_id
+                """,
+                (cutoff,),
+            )
+            merged = self.conn.execute(
+                "DELETE FROM observations WHERE ts < ? AND hourly = 0", (cutoff,)
+            ).rowcount
+            expired = self.conn.execute(
+                "DELETE FROM observations WHERE ts < ?", (now - HISTORY_RETENTION_DAYS * DAY,)
+            ).rowcount
+        logger.info("History compacted: %d raw rows downsampled, %d expired rows removed", merged, expired)
+
+    def _scope(self, pincode=None, region=None, product_ids=None):
+        clauses, params = [], []
+        if pincode is not None:
+            clauses.append("pincode = ?")
+            params.append(pincode)
+        if region is not None:
+            clauses.append("region = ?")
+            params.append(region)
+        if product_ids:
+            clauses.append(f"product_id IN ({', '.join('?' * len(product_ids))})")
+            params.extend(product_ids)
+        return (" AND ".join(clauses) or "1"), params
+
+    def restock_events(self, pincode=None, region=None, product_ids=None, since=None):
+        """(ts, pincode, product_id) for each Sold Out -> In Stock transition, oldest first."""
+        where, params = self._scope(pincode, region, product_ids)
+        if since is not None:
+            where += " AND ts >= ?"
+            params.append(int(since))
+        return self.conn.execute(
+            f"""
+            SELECT ts, pincode, product_id FROM (
+                SELECT ts, pincode, product_id, in_stock,
+                       LAG(in_stock) OVER (PARTITION BY pincode, product_id ORDER BY ts) AS previous
+                FROM observations
+                WHERE {where}
+            )
+            WHERE in_stock = 1 AND previous = 0
+            ORDER BY ts
+            """,
+            params,
+        ).fetchall()
+
+    def restock_windows(self, product_id=None, pincode=None, region=None):
+        """Per hour of week (0 = Monday 00:00 IST), the share of observed weeks with a restock then.
+
+        Returns (weeks_observed, {hour_of_week: probability}) for the given product
+        (all products if None) at a PIN or across a region.
+        """
+        product_ids = [product_id] if product_id is not None else None
+        where, params = self._scope(pincode, region, product_ids)
+        weeks = self.conn.execute(
+            f"SELECT COUNT(DISTINCT {WEEK_SQL.format(ts='ts')}) FROM observations WHERE {where}",
+            params,
+        ).fetchone()[0]
+        if not weeks:
+            return 0, {}
+        weeks_by_hour = {}
+        for ts, _, _ in self.restock_events(pincode, region, product_ids):
+            weeks_by_hour.setdefault(hour_of_week(ts), set()).add(week_of(ts))
+        return weeks, {hour: len(w) / weeks for hour, w in sorted(weeks_by_hour.items())}
+
+    def restock_likelihood(self, pincode, at=None, product_ids=None, horizon_hours=2):
+        """Chance of a restock at this PIN within horizon_hours of `at`, or None without enough history.
+
+        Uses the PIN's own history when it has at least HISTORY_MIN_EVENTS restocks,
+        otherwise its region's.
+        """
+        at = at if at is not None else time.time()
+        scope = None
+        for candidate in ({"pincode": pincode}, {"region": region_of(pincode)}):
+            if len(self.restock_events(product_ids=product_ids, **candidate)) >= HISTORY_MIN_EVENTS:
+                scope = candidate
+                break
+        if scope is None:
+            return None
+        likelihood = 0.0
+        for product_id in product_ids or [None]:
+            _, windows = self.restock_windows(product_id=product_id, **scope)
+            for offset in range(horizon_hours):
+                likelihood = max(likelihood, windows.get(hour_of_week(at + offset * HOUR), 0.0))
+        return likelihood
@@ -1,21 +1,45 @@
 import asyncio
 import json
 import base64
-import requests
 import time
+from functools import lru_cache
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import Application, CommandHandler, ContextTypes, CallbackQueryHandler
 
 # Local imports
+import catalog
 import common
 import config
 
 
 logger = common.setup_logging()
 
+KEYBOARD_EDIT_DEBOUNCE = 0.4  # Seconds to wait for further taps before editing the keyboard
+
+
+@lru_cache(maxsize=256)
+def build_products_keyboard(selected_bits, catalog_version):
+    """Build the /setproducts keyboard for a selection mask; cached since markups are immutable.
+
+    catalog_version is only part of the cache key, so new SKUs get fresh keyboards.
+    """
+    keyboard = []
+    for product in catalog.CATALOG:
+        callback_data = f"product_{product.id}"
+        selected = "✅ " if selected_bits >> product.id & 1 else ""
+        keyboard.append(
+            [InlineKeyboardButton(f"{selected}{product.short_name}", callback_data=callback_data)]
+        )
+    keyboard.append(
+        [InlineKeyboardButton("Confirm Selection", callback_data="confirm_products")]
+    )
+    return InlineKeyboardMarkup(keyboard)
+
 
 def update_users_file(users_data):
     """Update the users.json file in the GitHub repository."""
+    import requests
+
     max_retries = 3
     for attempt in range(max_retries):
         try:
@@ -108,12 +132,14 @@ async def set_pincode(update: Update, context: ContextTypes.DEFAULT_TYPE):
             {
                 "chat_id": str(chat_id),
                 "pincode": pincode,
-                "products": ["Any"],
+                "products": [catalog.ANY_ID],
                 "active": True,
             }
         )
 
     if update_users_file(users_data):
+        user = user or users[-1]
+        context.user_data["saved_products_bits"] = catalog.ids_to_bits(user["products"])
         await update.message.reply_text(
             f"PIN code set to {pincode}. You will receive notifications for available products."
         )
@@ -126,37 +152,44 @@ async def set_products(update: Update, context: ContextTypes.DEFAULT_TYPE):
     chat_id = update.effective_chat.id
     logger.info("Handling /setproducts command for chat_id %s", common.mask(chat_id))
 
-    users_data = common.read_users_file()
-    user = next((u for u in users_data["users"] if u["chat_id"] == str(chat_id)), None)
+    common.refresh_catalog()  # Picks up SKUs the checker found; rate-limited
 
-    if not user:
-        await update.message.reply_text(
-            "Please set your PIN code first using /setpincode PINCODE"
-        )
-        return
+    # Use the selection cached on confirm/setpincode; fall back to GitHub only when unknown
+    saved_bits = context.user_data.get("saved_products_bits")
+    if saved_bits is None:
+        users_data = common.read_users_file()
+        user = next((u for u in users_data["users"] if u["chat_id"] == str(chat_id)), None)
 
-    # Initialize or retrieve the user's current selection for editing
-    current_selection = set(user.get("products", ["Any"]))
-    context.user_data["selected_products"] = current_selection
+        if not user:
+            await update.message.reply_text(
+                "Please set your PIN code first using /setpincode PINCODE"
+            )
+            return
 
-    keyboard = []
-    for i, product in enumerate(common.PRODUCTS, 1):
-        callback_data = f"product_{i}"
-        display_text = common.PRODUCT_NAME_MAP[product]
-        selected = "✅ " if product in current_selection else ""
-        keyboard.append(
-            [InlineKeyboardButton(f"{selected}{display_text}", callback_data=callback_data)]
-        )
+        saved_bits = catalog.ids_to_bits(user["products"])
+        context.user_data["saved_products_bits"] = saved_bits
 
-    keyboard.append(
-        [InlineKeyboardButton("Confirm Selection", callback_data="confirm_products")]
-    )
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    await update.message.reply_text(
+    # Initialize the user's current selection for editing
+    context.user_data["selected_bits"] = saved_bits
+
+    message = await update.message.reply_text(
         "Select products to monitor (click 'Any of the products from the list' for all products):\n"
         "Toggle selections, then press 'Confirm Selection'.",
-        reply_markup=reply_markup,
+        reply_markup=build_products_keyboard(saved_bits, catalog.CATALOG.version),
     )
+    context.user_data["rendered_keyboard"] = (message.message_id, saved_bits)
+
+
+async def flush_keyboard_edit(message, user_data, bits):
+    """Apply a debounced keyboard edit, skipping it if a newer toggle superseded it."""
+    await asyncio.sleep(KEYBOARD_EDIT_DEBOUNCE)
+    if user_data.get("rendered_keyboard") == (message.message_id, bits):
+        return
+    try:
+        await message.edit_reply_markup(reply_markup=build_products_keyboard(bits, catalog.CATALOG.version))
+        user_data["rendered_keyboard"] = (message.message_id, bits)
+    except Exception as e:
+        logger.error("Error editing product keyboard: %s", str(e))
 
 
 async def product_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -168,7 +201,8 @@ async def product_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     try:
         if query.data == "confirm_products":
-            selected_products = list(context.user_data.get("selected_products", []))
+            selected_bits = context.user_data.get("selected_bits", 0)
+            selected_products = catalog.bits_to_ids(selected_bits)
             if not selected_products:
                 await query.message.reply_text(
                     "No products selected. Please select at least one product or 'Any of the products from the list'."
@@ -187,64 +221,39 @@ async def product_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
             user["active"] = True
 
             if update_users_file(users_data):
-                display_products = [common.PRODUCT_NAME_MAP[p] for p in selected_products]
+                display_products = [
+                    product.short_name for product in map(catalog.CATALOG.get, selected_products) if product
+                ]
                 await query.message.reply_text(
                     f"You'll get notifications for:\n" + "\n".join(f"- {p}" for p in display_products),
                     parse_mode="Markdown",
                 )
                 logger.info("User %s set products: %s", common.mask(chat_id), selected_products)
-                context.user_data.pop("selected_products", None)
+                context.user_data["saved_products_bits"] = selected_bits
+                context.user_data.pop("selected_bits", None)
             else:
                 await query.message.reply_text("Failed to update products. Please try again.")
             return
 
         if query.data.startswith("product_"):
-            index = int(query.data.replace("product_", "")) - 1
-            if index < 0 or index >= len(common.PRODUCTS):
-                logger.warning("Invalid product index %d for chat_id %s", index, common.mask(chat_id))
+            product = catalog.CATALOG.get(int(query.data.replace("product_", "")))
+            if not product:
+                logger.warning("Invalid product callback %s for chat_id %s", query.data, common.mask(chat_id))
                 return
 
-            selected_product = common.PRODUCTS[index]
-            selected_products = context.user_data.setdefault("selected_products", set())
-
-            if selected_product == "Any":
-                if "Any" in selected_products:
-                    selected_products.clear()
-                    logger.info("User %s deselected 'Any'", common.mask(chat_id))
-                else:
-                    selected_products.clear()
-                    selected_products.add("Any")
-                    logger.info(
-                        "User %s selected 'Any', clearing specific products", common.mask(chat_id)
-                    )
-            else:
-                selected_products.discard("Any")  # Remove 'Any' if a specific item is chosen
-                if selected_product in selected_products:
-                    selected_products.remove(selected_product)
-                    logger.info(
-                        "User %s deselected product: %s", common.mask(chat_id), selected_product
-                    )
-                else:
-                    selected_products.add(selected_product)
-                    logger.info(
-                        "User %s selected product: %s", common.mask(chat_id), selected_product
-                    )
-
-            # Rebuild keyboard with updated selections
-            keyboard = []
-            for i, product in enumerate(common.PRODUCTS, 1):
-                callback_data = f"product_{i}"
-                display_text = common.PRODUCT_NAME_MAP[product]
-                is_selected = product in selected_products
-                selected = "✅ " if is_selected else ""
-                keyboard.append(
-                    [InlineKeyboardButton(f"{selected}{display_text}", callback_data=callback_data)]
-                )
-            keyboard.append(
-                [InlineKeyboardButton("Confirm Selection", callback_data="confirm_products")]
+            selected_bits = catalog.toggle_bit(context.user_data.get("selected_bits", 0), product.id)
+            context.user_data["selected_bits"] = selected_bits
+            logger.info(
+                "User %s toggled product: %s", common.mask(chat_id), product.name
+            )
+
+            # Collapse rapid taps into a single edit of the latest selection
+            pending = context.user_data.get("pending_keyboard_edit")
+            if pending and not pending.done():
+                pending.cancel()
+            context.user_data["pending_keyboard_edit"] = asyncio.create_task(
+                flush_keyboard_edit(query.message, context.user_data, selected_bits)
             )
-            reply_markup = InlineKeyboardMarkup(keyboard)
-            await query.message.edit_reply_markup(reply_markup=reply_markup)
 
     except Exception as e:
         logger.error("Error in product callback for chat_id %s: %s", common.mask(chat_id), str(e))
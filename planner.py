@@ -0,0 +1,125 @@
+import hashlib
+import json
+import logging
+import os
+import time
+
+from catalog import ANY_ID
+from config import (
+    PLANNER_STATE_FILE,
+    CHECK_INTERVAL_MIN,
+    CHECK_INTERVAL_MAX,
+    CHECK_INTERVAL_SLACK,
+    VOLATILITY_ALPHA,
+    RESTOCK_INTERVAL_FAST,
+    RESTOCK_INTERVAL_SLOW,
+)
+
+
+def _digest(obj):
+    return hashlib.sha1(json.dumps(obj, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def subscribers_digest(users):
+    """Digest of who is subscribed to a PIN and for what, used to spot users.json changes."""
+    return _digest(sorted((str(u.get("chat_id")), sorted(u.get("products", []))) for u in users))
+
+
+def result_digest(product_status):
+    return _digest(sorted(product_status))
+
+
+def watched_products(users):
+    """Product IDs the PIN's subscribers care about, or None if any of them wants 'Any'."""
+    ids = set()
+    for user in users:
+        if ANY_ID in user.get("products", [ANY_ID]):
+            return None
+        ids.update(user["products"])
+    return sorted(ids)
+
+
+class RunPlanner:
+    """Decides which PIN codes are due for a check on this run.
+
+    Per PIN it remembers the last successful check time, a digest of the last
+    result and of its subscribers, and a volatility score: an exponential moving
+    average of how often the result changed between checks. Volatile PINs are
+    checked every CHECK_INTERVAL_MIN, stable ones back off towards CHECK_INTERVAL_MAX.
+    With an availability history, the interval is further shortened when a restock
+    of a subscribed product is likely soon and stretched when history shows none.
+    """
+
+    def __init__(self, path=PLANNER_STATE_FILE, now=None, history=None):
+        self.path = path
+        self.history = history
+        self.now = now if now is not None else time.time()
+        self.state = self._load()
+
+    def _load(self):
+        logger = logging.getLogger(__name__)
+        if not self.path or not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                return json.load(f).get("pincodes", {})
+        except (OSError, ValueError) as e:
+            logger.error("Could not load planner state from %s: %s", self.path, str(e))
+            return {}
+
+    def save(self):
+        logger = logging.getLogger(__name__)
+        try:
+            with open(self.path, "w", encoding="utf-8") as f:
+                json.dump({"pincodes": self.state}, f, indent=2)
+        except OSError as e:
+            logger.error("Could not save planner state to %s: %s", self.path, str(e))
+
+    def interval(self, pincode, users=()):
+        volatility = self.state.get(pincode, {}).get("volatility", 1.0)
+        interval = CHECK_INTERVAL_MAX - (CHECK_INTERVAL_MAX - CHECK_INTERVAL_MIN) * volatility
+        if self.history is not None:
+            likelihood = self.history.restock_likelihood(pincode, self.now, watched_products(users))
+            if likelihood is not None:
+                interval *= RESTOCK_INTERVAL_SLOW - (RESTOCK_INTERVAL_SLOW - RESTOCK_INTERVAL_FAST) * likelihood
+        # A likely restock may take even the most volatile PIN below CHECK_INTERVAL_MIN
+        return max(interval, CHECK_INTERVAL_MIN * RESTOCK_INTERVAL_FAST)
+
+    def plan(self, pincode_groups, force_full=False):
+        """Split PINs into (due, skipped); due is a list of (pincode, reason), most overdue first."""
+        # Forget PINs nobody is subscribed to anymore
+        for pincode in set(self.state) - set(pincode_groups):
+            del self.state[pincode]
+
+        due, skipped = [], []
+        for pincode, users in pincode_groups.items():
+            entry = self.state.get(pincode)
+            if force_full:
+                due.append((pincode, "forced", float("inf")))
+            elif not entry or "last_check" not in entry:
+                due.append((pincode, "new", float("inf")))
+            elif entry.get("subscribers") != subscribers_digest(users):
+                due.append((pincode, "subscribers changed", float("inf")))
+            else:
+                overdue = (self.now - entry["last_check"] + CHECK_INTERVAL_SLACK) / self.interval(pincode, users)
+                if overdue >= 1:
+                    due.append((pincode, "stale", overdue))
+                else:
+                    skipped.append(pincode)
+        due.sort(key=lambda item: item[2], reverse=True)
+        return [(pincode, reason) for pincode, reason, _ in due], skipped
+
+    def record(self, pincode, users, product_status):
+        """Record a successful check of a PIN and update its volatility."""
+        entry = self.state.setdefault(pincode, {})
+        digest = result_digest(product_status)
+        if "result_hash" in entry:
+            changed = 1.0 if digest != entry["result_hash"] else 0.0
+            entry["volatility"] = (
+                VOLATILITY_ALPHA * changed + (1 - VOLATILITY_ALPHA) * entry.get("volatility", 1.0)
+            )
+        else:
+            entry["volatility"] = 1.0
+        entry["result_hash"] = digest
+        entry["subscribers"] = subscribers_digest(users)
+        entry["last_check"] = self.now
@@ -0,0 +1,159 @@
+import logging
+import threading
+import time
+
+import psutil
+
+from config import (
+    SESSION_RSS_BUDGET_MB,
+    GLOBAL_RSS_CEILING_MB,
+    SESSION_THROTTLE_TIMEOUT,
+)
+
+MB = 1024 * 1024
+
+
+class SessionSupervisor:
+    """Tracks memory of Selenium Chrome sessions through their chromedriver process trees.
+
+    Sessions over SESSION_RSS_BUDGET_MB are flagged for recycling, new sessions wait
+    while all tracked sessions together exceed GLOBAL_RSS_CEILING_MB, and processes
+    left behind after a driver quit are killed.
+    """
+
+    def __init__(self, session_budget_mb=SESSION_RSS_BUDGET_MB, global_ceiling_mb=GLOBAL_RSS_CEILING_MB):
+        self.session_budget = session_budget_mb * MB
+        self.global_ceiling = global_ceiling_mb * MB
+        self._lock = threading.Lock()
+        self._sessions = {}
+        self.reset_stats()
+
+    def reset_stats(self):
+        with self._lock:
+            self.stats = {
+                "sessions_started": 0,
+                "sessions_recycled": 0,
+                "processes_reaped": 0,
+                "throttled_starts": 0,
+                "peak_session_rss": 0,
+                "peak_total_rss": 0,
+            }
+
+    @staticmethod
+    def _root_process(driver):
+        try:
+            return psutil.Process(driver.service.process.pid)
+        except (AttributeError, psutil.Error):
+            return None
+
+    def register(self, driver):
+        root = self._root_process(driver)
+        with self._lock:
+            self.stats["sessions_started"] += 1
+            if root:
+                self._sessions[id(driver)] = root
+
+    def process_tree(self, driver):
+        """The driver's chromedriver process and all its descendants."""
+        root = self._sessions.get(id(driver)) or self._root_process(driver)
+        if not root:
+            return []
+        try:
+            return [root] + root.children(recursive=True)
+        except psutil.Error:
+            return [root]
+
+    @staticmethod
+    def _tree_rss(processes):
+        total = 0
+        for proc in processes:
+            try:
+                total += proc.memory_info().rss
+            except psutil.Error:
+                continue
+        return total
+
+    def session_rss(self, driver):
+        rss = self._tree_rss(self.process_tree(driver))
+        with self._lock:
+            self.stats["peak_session_rss"] = max(self.stats["peak_session_rss"], rss)
+        return rss
+
+    def total_rss(self):
+        with self._lock:
+            roots = list(self._sessions.values())
+        total = 0
+        for root in roots:
+            try:
+                total += self._tree_rss([root] + root.children(recursive=True))
+            except psutil.Error:
+                continue
+        with self._lock:
+            self.stats["peak_total_rss"] = max(self.stats["peak_total_rss"], total)
+        return total
+
+    def over_budget(self, driver):
+        """True if the session should be recycled; counts it as recycled."""
+        logger = logging.getLogger(__name__)
+        rss = self.session_rss(driver)
+        if rss <= self.session_budget:
+            return False
+        logger.warning(
+            "Chrome session using %.0f MB (budget %.0f MB), recycling",
+            rss / MB,
+            self.session_budget / MB,
+        )
+        with self._lock:
+            self.stats["sessions_recycled"] += 1
+        return True
+
+    def wait_for_capacity(self, timeout=SESSION_THROTTLE_TIMEOUT):
+        """Block a new session while tracked sessions exceed the global ceiling, up to timeout."""
+        logger = logging.getLogger(__name__)
+        deadline = time.monotonic() + timeout
+        throttled = False
+        while self.total_rss() > self.global_ceiling and time.monotonic() < deadline:
+            if not throttled:
+                throttled = True
+                with self._lock:
+                    self.stats["throttled_starts"] += 1
+                logger.warning(
+                    "Chrome sessions above %.0f MB ceiling, waiting before starting another",
+                    self.global_ceiling / MB,
+                )
+            time.sleep(1)
+        if throttled and time.monotonic() >= deadline:
+            logger.warning("Memory ceiling still exceeded after %ds, starting session anyway", timeout)
+
+    def reap(self, driver, processes, timeout=3):
+        """Kill whatever is still alive from a process tree captured before driver.quit()."""
+        logger = logging.getLogger(__name__)
+        with self._lock:
+            self._sessions.pop(id(driver), None)
+        alive = []
+        for proc in processes:
+            try:
+                if proc.is_running() and proc.status() != psutil.STATUS_ZOMBIE:
+                    alive.append(proc)
+            except psutil.Error:
+                continue
+        if not alive:
+            return 0
+        _, alive = psutil.wait_procs(alive, timeout=timeout)
+        for proc in alive:
+            try:
+                proc.kill()
+            except psutil.Error:
+                continue
+        if alive:
+            logger.warning("Killed %d orphaned chrome/chromedriver processes", len(alive))
+            with self._lock:
+                self.stats["processes_reaped"] += len(alive)
+        return len(alive)
+
+    def summary(self):
+        with self._lock:
+            stats = dict(self.stats)
+        stats["peak_session_rss_mb"] = round(stats.pop("peak_session_rss") / MB, 1)
+        stats["peak_total_rss_mb"] = round(stats.pop("peak_total_rss") / MB, 1)
+        return stats
@@ -0,0 +1,69 @@
+import gzip
+import os
+
+from artifacts import ArtifactStore
+
+
+class FakeDriver:
+    def __init__(self, data):
+        self.data = data
+
+    def get_screenshot_as_png(self):
+        return self.data
+
+
+def _store(tmp_path, **kwargs):
+    return ArtifactStore(directory=str(tmp_path / "artifacts"), **kwargs)
+
+
+def test_captures_are_named_per_pin_and_never_overwrite(tmp_path):
+    store = _store(tmp_path)
+    store.capture_page("<html>one</html>", "560001", "page_source")
+    store.capture_page("<html>two</html>", "560001", "page_source")
+    store.close()
+
+    names = sorted(os.listdir(store.directory))
+    assert len(names) == 2
+    assert all(name.endswith("_56xx01_page_source.html.gz") for name in names)
+    with open(os.path.join(store.directory, names[1]), "rb") as f:
+        assert gzip.decompress(f.read()) == b"<html>two</html>"
+    assert store.summary() == {"written": 2, "dropped": 0, "evicted": 0}
+
+
+def test_oldest_files_are_evicted_past_max_files(tmp_path):
+    store = _store(tmp_path, max_files=2)
+    for pincode in ("110001", "220002", "330003"):
+        store.capture_screenshot(FakeDriver(b"png"), pincode, "error")
+    store.close()
+
+    names = sorted(os.listdir(store.directory))
+    assert [name.split("_")[2] for name in names] == ["22xx02", "33xx03"]
+    assert store.summary()["evicted"] == 1
+
+
+def test_oldest_files_are_evicted_past_max_mb(tmp_path):
+    store = _store(tmp_path, max_mb=1500 / (1024 * 1024))
+    store.capture_screenshot(FakeDriver(b"x" * 1000), "110001", "error")
+    store.capture_screenshot(FakeDriver(b"y" * 1000), "220002", "error")
+    store.close()
+
+    assert len(os.listdir(store.directory)) == 1
+    assert store.summary() == {"written": 2, "dropped": 0, "evicted": 1}
+
+
+def test_full_queue_drops_instead_of_blocking(tmp_path):
+    store = _store(tmp_path, queue_size=1)
+    store._ensure_writer = lambda: None  # No writer draining the queue
+    store.capture_page("<html></html>", "560001", "page_source")
+    store.capture_page("<html></html>", "560001", "page_source")
+    assert store.summary()["dropped"] == 1
+
+
+def test_disabled_store_writes_nothing(tmp_path):
+    store = _store(tmp_path, enabled=False)
+    store.capture_screenshot(FakeDriver(b"png"), "560001", "error")
+    store.capture_page("<html></html>", "560001", "page_source")
+    store.close()
+
+    assert not os.path.exists(store.directory)
+    assert store.summary() == {"written": 0, "dropped": 0, "evicted": 0}
@@ -0,0 +1,50 @@
+from catalog import ANY_ID, CATALOG, bits_to_ids, ids_to_bits, load_catalog, toggle_bit
+
+
+def test_resolve_legacy_names_and_ids():
+    assert CATALOG.resolve_products(["Any"]) == [ANY_ID]
+    assert CATALOG.resolve_products(["Amul Whey Protein, 32 g | Pack of 30 Sachets"]) == [17]
+    assert CATALOG.resolve_products(["🧀 Paneer 400g | Pack of 2"]) == [15]
+    assert CATALOG.resolve_products(["Paneer", 3]) == [14, 15, 3]
+
+
+def test_resolve_missing_list_means_any():
+    assert CATALOG.resolve_products(None) == [ANY_ID]
+
+
+def test_resolve_unmatched_entries_never_widen_to_any():
+    assert CATALOG.resolve_products([]) == []
+    assert CATALOG.resolve_products(["Amul Kool Protein Milkshake | Strawberry, 180 mL | Pack of 8"]) == []
+
+
+def test_resolve_keeps_unknown_ids():
+    # IDs from the shared catalog this process has not loaded must survive a users.json rewrite
+    assert CATALOG.resolve_products([999]) == [999]
+    assert CATALOG.resolve_products([999, 5]) == [999, 5]
+
+
+def test_selection_bits():
+    bits = toggle_bit(ids_to_bits([ANY_ID]), 5)
+    assert bits_to_ids(bits) == [5]
+    assert bits_to_ids(toggle_bit(bits, ANY_ID)) == [ANY_ID]
+    assert toggle_bit(ids_to_bits([ANY_ID]), ANY_ID) == 0
+
+
+def test_register_scraped_ids_do_not_depend_on_order():
+    first, second = load_catalog(None), load_catalog(None)
+    names = ["Amul Protein Ice Cream, 125 mL", "Amul High Protein Curd, 400 g", "Amul Whey Protein, 32 g | Pack of 30 Sachets"]
+    first.register_scraped(names)
+    second.register_scraped(reversed(names))
+    assert first.to_dict() == second.to_dict()
+    assert [p.id for p in first.register_scraped(["Amul High Protein Curd, 400 g"])] == []
+
+
+def test_update_from_round_trip_keeps_version_when_unchanged():
+    source = load_catalog(None)
+    source.register_scraped(["Amul Protein Ice Cream, 125 mL"])
+    target = load_catalog(None)
+    target.update_from(source.to_dict())
+    assert target.lookup("Amul Protein Ice Cream, 125 mL").id == 22
+    version = target.version
+    target.update_from(source.to_dict())
+    assert target.version == version
@@ -0,0 +1,129 @@
+import check_products
+from artifacts import ArtifactStore
+
+
+def test_split_batches_respects_limits_and_keeps_every_pin(monkeypatch):
+    monkeypatch.setattr(check_products, "SEMAPHORE_LIMIT", 3)
+    monkeypatch.setattr(check_products, "PINS_PER_SESSION", 4)
+    assert check_products._split_batches([]) == []
+    for count in (1, 2, 3, 7, 12, 13, 30):
+        pincodes = [str(100000 + i) for i in range(count)]
+        batches = check_products._split_batches(pincodes)
+        assert sorted(p for batch in batches for p in batch) == pincodes
+        assert all(0 < len(batch) <= 4 for batch in batches)
+        # Use the concurrency limit before growing sessions, and no more sessions than needed
+        assert len(batches) == max(min(3, count), -(-count // 4))
+
+
+class FakeDriver:
+    def __init__(self, number):
+        self.number = number
+
+
+class FakeSite:
+    """Replaces the Selenium helpers check_many() drives, recording each call."""
+
+    def __init__(self, monkeypatch, selector_opens=True, stale_grid=(), crash=()):
+        self.calls = []
+        self.drivers = 0
+        self.selector_opens = selector_opens
+        self.stale_grid = set(stale_grid)  # PINs whose grid does not re-render in place
+        self.crash = set(crash)
+        monkeypatch.setattr(check_products, "pincode_cache", {})
+        monkeypatch.setattr(check_products, "artifact_store", ArtifactStore(enabled=False))
+        for name in (
+            "_new_driver",
+            "_load_browse_page",
+            "_reset_location",
+            "_open_location_selector",
+            "_current_grid",
+            "_enter_pincode",
+            "_read_product_grid",
+            "_quit_driver_with_timeout",
+        ):
+            monkeypatch.setattr(check_products, name, getattr(self, name[1:]))
+
+    def new_driver(self):
+        self.drivers += 1
+        self.calls.append(("new_driver", self.drivers))
+        return FakeDriver(self.drivers)
+
+    def load_browse_page(self, driver):
+        self.calls.append(("load", driver.number))
+
+    def reset_location(self, driver):
+        self.calls.append(("reset", driver.number))
+
+    def open_location_selector(self, driver):
+        self.calls.append(("selector", driver.number))
+        return self.selector_opens
+
+    def current_grid(self, driver):
+        return ["previous grid"]
+
+    def enter_pincode(self, driver, pincode):
+        self.calls.append(("enter", pincode))
+        return True
+
+    def read_product_grid(self, driver, pincode, previous_grid):
+        if pincode in self.crash:
+            raise RuntimeError("chrome crashed")
+        if previous_grid and pincode in self.stale_grid:
+            return None
+        return [(f"product at {pincode}", "In Stock")]
+
+    def quit_driver_with_timeout(self, driver, pincode, timeout=5):
+        self.calls.append(("quit", driver.number))
+
+
+def _results(pincodes):
+    return dict(check_products.check_many(pincodes))
+
+
+def test_check_many_switches_in_place(monkeypatch):
+    site = FakeSite(monkeypatch)
+    results = _results(["111111", "222222"])
+    assert all(results.values())
+    assert site.calls == [
+        ("new_driver", 1), ("load", 1), ("enter", "111111"),
+        ("selector", 1), ("enter", "222222"),
+        ("quit", 1),
+    ]
+
+
+def test_check_many_reloads_when_selector_does_not_open(monkeypatch):
+    site = FakeSite(monkeypatch, selector_opens=False)
+    results = _results(["111111", "222222", "333333"])
+    assert all(results.values())
+    assert site.calls == [
+        ("new_driver", 1), ("load", 1), ("enter", "111111"),
+        ("selector", 1), ("reset", 1), ("enter", "222222"),
+        ("reset", 1), ("enter", "333333"),
+        ("quit", 1),
+    ]
+
+
+def test_check_many_retries_once_when_grid_does_not_rerender(monkeypatch):
+    site = FakeSite(monkeypatch, stale_grid={"222222", "333333"})
+    results = _results(["111111", "222222", "333333"])
+    assert all(results.values())
+    assert site.calls == [
+        ("new_driver", 1), ("load", 1), ("enter", "111111"),
+        ("selector", 1), ("enter", "222222"), ("reset", 1), ("enter", "222222"),
+        # Reload mode for the rest of the session: no more in-place attempts
+        ("reset", 1), ("enter", "333333"),
+        ("quit", 1),
+    ]
+
+
+def test_check_many_starts_fresh_driver_after_error(monkeypatch):
+    site = FakeSite(monkeypatch, crash={"222222"})
+    results = _results(["111111", "222222", "333333"])
+    assert results["222222"] == []
+    assert results["111111"] and results["333333"]
+    assert site.calls == [
+        ("new_driver", 1), ("load", 1), ("enter", "111111"),
+        ("selector", 1), ("enter", "222222"), ("quit", 1),
+        ("new_driver", 2), ("load", 2), ("enter", "333333"),
+        ("quit", 2),
+    ]
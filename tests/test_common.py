@@ -0,0 +1,41 @@
+import sys
+import types
+
+import pytest
+
+import common
+
+
+class FakeResponse:
+    def __init__(self, status_code, payload=None):
+        self.status_code = status_code
+        self._payload = payload
+        self.text = ""
+
+    def json(self):
+        return self._payload
+
+
+@pytest.fixture
+def catalog_requests(monkeypatch):
+    responses = []
+    fake = types.SimpleNamespace(get=lambda url, headers=None: responses.pop(0))
+    monkeypatch.setitem(sys.modules, "requests", fake)
+    monkeypatch.setattr(common, "_catalog_refreshed_at", None)
+    return responses
+
+
+def test_read_catalog_file_distinguishes_missing_from_failed(catalog_requests):
+    catalog_requests += [FakeResponse(404), FakeResponse(503)]
+    assert common.read_catalog_file() is None
+    assert common.read_catalog_file() is False
+
+
+def test_refresh_catalog_failure_is_reported_and_retried(catalog_requests):
+    catalog_requests += [FakeResponse(503), FakeResponse(404)]
+    assert common.refresh_catalog() is False
+    assert common._catalog_refreshed_at is None
+    assert common.refresh_catalog() is True
+    assert common._catalog_refreshed_at is not None
+    # Fresh now; no further request is made (the fake would raise IndexError)
+    assert common.refresh_catalog() is True
@@ -0,0 +1,49 @@
+from catalog import CATALOG
+from config import HISTORY_RAW_DAYS
+from history import AvailabilityHistory, DAY, HOUR, IST_OFFSET, hour_of_week
+
+PRODUCT = CATALOG.get(12)
+PINCODE = "560001"
+# Monday 2024-01-01 00:00 IST
+MONDAY = 1704047400
+
+
+def _record_weeks(history, weeks, restock_minute):
+    """Every 15 minutes for `weeks` weeks; in stock from Monday 10:<restock_minute> IST to 12:00."""
+    for week in range(weeks):
+        for quarter in range(7 * 24 * 4):
+            ts = MONDAY + week * 7 * DAY + quarter * 15 * 60
+            offset = ts - MONDAY - week * 7 * DAY
+            in_stock = 10 * HOUR + restock_minute * 60 <= offset < 12 * HOUR
+            history.record(PINCODE, [(PRODUCT.name, "In Stock" if in_stock else "Sold Out")], ts)
+
+
+def test_monday_is_hour_zero():
+    assert hour_of_week(MONDAY) == 0
+    assert hour_of_week(MONDAY + 10 * HOUR + 10 * 60) == 10
+
+
+def test_restock_windows_survive_compaction(tmp_path):
+    history = AvailabilityHistory(str(tmp_path / "history.db"))
+    _record_weeks(history, weeks=3, restock_minute=15)
+    before = history.restock_windows(product_id=PRODUCT.id, pincode=PINCODE)
+    assert before == (3, {10: 1.0})
+
+    history.compact(now=MONDAY + 3 * 7 * DAY + HISTORY_RAW_DAYS * DAY)
+
+    hourly = history.conn.execute("SELECT COUNT(*) FROM observations WHERE hourly = 1").fetchone()[0]
+    assert hourly > 0
+    assert history.restock_windows(product_id=PRODUCT.id, pincode=PINCODE) == before
+    history.close()
+
+
+def test_compacted_rows_start_on_ist_hours(tmp_path):
+    history = AvailabilityHistory(str(tmp_path / "history.db"))
+    _record_weeks(history, weeks=1, restock_minute=15)
+    history.compact(now=MONDAY + 7 * DAY + HISTORY_RAW_DAYS * DAY)
+    misaligned = history.conn.execute(
+        "SELECT COUNT(*) FROM observations WHERE hourly = 1 AND (ts + ?) % ? != 0",
+        (IST_OFFSET, HOUR),
+    ).fetchone()[0]
+    assert misaligned == 0
+    history.close()
@@ -0,0 +1,64 @@
+from config import (
+    CHECK_INTERVAL_MAX,
+    CHECK_INTERVAL_MIN,
+    CHECK_RUN_CADENCE,
+    RESTOCK_INTERVAL_FAST,
+    RESTOCK_INTERVAL_SLOW,
+)
+from planner import RunPlanner
+
+USERS = [{"chat_id": "1", "products": [12]}]
+
+
+class FixedHistory:
+    def __init__(self, likelihood):
+        self.likelihood = likelihood
+
+    def restock_likelihood(self, pincode, at=None, product_ids=None, horizon_hours=2):
+        return self.likelihood
+
+
+def _planner(tmp_path, volatility, history=None):
+    planner = RunPlanner(path=str(tmp_path / "state.json"), now=10_000, history=history)
+    planner.state["560001"] = {"volatility": volatility}
+    return planner
+
+
+def test_interval_follows_volatility(tmp_path):
+    assert _planner(tmp_path, 1.0).interval("560001", USERS) == CHECK_INTERVAL_MIN
+    assert _planner(tmp_path, 0.0).interval("560001", USERS) == CHECK_INTERVAL_MAX
+
+
+def test_likely_restock_shortens_volatile_pin_below_minimum(tmp_path):
+    planner = _planner(tmp_path, 1.0, FixedHistory(1.0))
+    assert planner.interval("560001", USERS) == CHECK_INTERVAL_MIN * RESTOCK_INTERVAL_FAST
+
+
+def test_unlikely_restock_stretches_interval(tmp_path):
+    planner = _planner(tmp_path, 0.0, FixedHistory(0.0))
+    assert planner.interval("560001", USERS) == CHECK_INTERVAL_MAX * RESTOCK_INTERVAL_SLOW
+
+
+def test_plan_checks_new_changed_and_stale_pins(tmp_path):
+    groups = {"111111": USERS, "222222": USERS, "333333": USERS}
+    planner = RunPlanner(path=str(tmp_path / "state.json"), now=0)
+    for pincode in ("222222", "333333"):
+        planner.record(pincode, USERS, [("a", "In Stock")])
+    planner.state["333333"]["subscribers"] = "outdated"
+    planner.now = CHECK_INTERVAL_MIN / 2
+
+    due, skipped = planner.plan(groups)
+    assert sorted(due) == [("111111", "new"), ("333333", "subscribers changed")]
+    assert skipped == ["222222"]
+
+
+def test_stable_pin_is_skipped_between_scheduled_runs(tmp_path):
+    groups = {"560001": USERS}
+    planner = RunPlanner(path=str(tmp_path / "state.json"), now=0)
+    planner.record("560001", USERS, [("a", "In Stock")])
+    planner.state["560001"]["volatility"] = 0.0
+
+    planner.now = CHECK_RUN_CADENCE
+    assert planner.plan(groups) == ([], ["560001"])
+    planner.now = CHECK_INTERVAL_MAX
+    assert planner.plan(groups) == ([("560001", "stale")], [])
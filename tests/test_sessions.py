@@ -0,0 +1,65 @@
+import subprocess
+from types import SimpleNamespace
+
+import psutil
+import pytest
+
+from sessions import SessionSupervisor
+
+
+@pytest.fixture
+def driver():
+    """A stand-in for a Selenium driver whose chromedriver is a sleeping child process."""
+    process = subprocess.Popen(["sleep", "30"])
+    yield SimpleNamespace(service=SimpleNamespace(process=process))
+    process.kill()
+    process.wait()
+
+
+def test_reap_kills_and_counts_survivors(driver):
+    supervisor = SessionSupervisor()
+    supervisor.register(driver)
+    processes = supervisor.process_tree(driver)
+    assert [p.pid for p in processes] == [driver.service.process.pid]
+
+    assert supervisor.reap(driver, processes, timeout=0.1) == 1
+    assert driver.service.process.wait(timeout=5) is not None
+    assert supervisor.summary()["processes_reaped"] == 1
+    assert supervisor.total_rss() == 0  # No longer tracked
+
+
+def test_reap_ignores_processes_that_already_exited(driver):
+    supervisor = SessionSupervisor()
+    processes = supervisor.process_tree(driver)
+    driver.service.process.kill()
+    driver.service.process.wait()
+    assert supervisor.reap(driver, processes, timeout=0.1) == 0
+    assert supervisor.summary()["processes_reaped"] == 0
+
+
+def test_over_budget_and_summary_report_rss(driver):
+    rss = psutil.Process(driver.service.process.pid).memory_info().rss
+    generous = SessionSupervisor(session_budget_mb=1024)
+    assert not generous.over_budget(driver)
+
+    tight = SessionSupervisor(session_budget_mb=rss / 2 / (1024 * 1024))
+    tight.register(driver)
+    assert tight.over_budget(driver)
+    tight.total_rss()
+    summary = tight.summary()
+    assert summary["sessions_started"] == 1
+    assert summary["sessions_recycled"] == 1
+    assert summary["peak_session_rss_mb"] > 0
+    assert summary["peak_total_rss_mb"] > 0
+
+
+def test_wait_for_capacity_throttles_only_above_ceiling(driver):
+    roomy = SessionSupervisor(global_ceiling_mb=1024)
+    roomy.register(driver)
+    roomy.wait_for_capacity(timeout=5)
+    assert roomy.summary()["throttled_starts"] == 0
+
+    full = SessionSupervisor(global_ceiling_mb=0)
+    full.register(driver)
+    full.wait_for_capacity(timeout=0.5)  # Gives up after the timeout and starts anyway
+    assert full.summary()["throttled_starts"] == 1